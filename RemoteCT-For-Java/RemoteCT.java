@@ -10,6 +10,14 @@ import java.awt.image.BufferedImage;
 import java.util.Base64;
 import org.json.JSONArray;
 
+/**
+ * Java client of RemoteConnectionToolkit 1.4.x.
+ *
+ * @deprecated It speaks the string protocol of 1.4.x: RemoteConnectionToolkit 1.5.0
+ * changed the wire format to length-prefixed frames, so this client can not even complete
+ * the handshake. It is kept for 1.4.x computers only and is not maintained any more.
+ */
+@Deprecated
 public class RemoteCT {
     private static final String VERSION = "1.4.0";
     public static final String WRCT_ANY_IP_ADDRESS = "WRCT_ANY_IP_ADDRESS";
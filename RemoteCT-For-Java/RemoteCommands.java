@@ -6,6 +6,12 @@ import javax.imageio.ImageIO;
 import org.json.JSONArray;
 import java.util.Base64;
 
+/**
+ * Built-in commands of the 1.4.x Java client.
+ *
+ * @deprecated See {@link RemoteCT}: only for RemoteConnectionToolkit 1.4.x.
+ */
+@Deprecated
 public class RemoteCommands {
     public static Map<String, BiConsumer<RemoteCT, String[]>> getBuiltinCommands() {
         Map<String, BiConsumer<RemoteCT, String[]>> commands = new HashMap<>();
@@ -11,25 +11,142 @@ communicating remotely with a computer, all digits except for the third digit of
 version number must be the same in order to continue communication.
 """
 
+import io
 import os
 import re
 import sys
+import stat
 import PIL.Image
 import mss
+import numpy
 import time
+import queue
 import json
+import math
+import mmap
+import hashlib
+import fnmatch
+import tarfile
+import bz2
+import lzma
+import zlib
 import base64
+import copy
+import bisect
+import weakref
+import contextvars
+import http.server
+import urllib.request
+import argparse
+import contextlib
 import socket
+import random
+import secrets
+import itertools
+import asyncio
+import inspect
+import struct
 import logging
 import tkinter
 import threading
+import multiprocessing
+import collections
+import concurrent.futures
 
 import Fun
 
 
-__version__ = "1.4.0"
+__version__ = "1.5.0"
 WRCT_ANY_IP_ADDRESS = "WRCT_ANY_IP_ADDRESS"
 
+# Wire protocol: every message is a frame made of a fixed header followed by the
+# payload. Header: payload length (uint32), message type (uint8), flags (uint8).
+FRAME_HEADER = struct.Struct("!IBB")
+FRAME_HELLO = 0x01  # Version handshake
+FRAME_EVENT = 0x02  # Event call: "EventKeyWord|arg1,arg2,..."
+FRAME_REPLY = 0x03  # Answer of an event handler to its caller
+FRAME_DATA = 0x04  # Chunk of a bulk payload (file content, ...)
+FRAME_END = 0x05  # End of a bulk payload
+FRAME_CHECKSUM = 0x06  # Checksum of a file chunk
+FRAME_STRIPE = 0x07  # Number of data connections joining a striped transfer
+FRAME_COPY = 0x08  # Delta transfer: reuse blocks of the file the receiver already has
+FRAME_CALL = 0x09  # RPC request: call ID, then "EventKeyWord|arg1,arg2,..."
+FRAME_RESULT = 0x0A  # RPC answer: call ID, status, then the result
+FRAME_WINDOW = 0x0B  # Flow control: the receiver consumed bytes of a channel, see CHANNEL_WINDOW
+FRAME_PING = 0x0C  # Heartbeat: monotonic clock of the sender, see HEARTBEAT
+FRAME_PONG = 0x0D  # Heartbeat answer, echoes the payload of the FRAME_PING
+FRAME_ACK = 0x0E  # Resumable sessions: number of frames received, see RESUME_COUNT
+FRAME_ABORT = 0x0F  # The handler of a stream failed, the payload is the error message
+LINK_FRAMES = (FRAME_WINDOW, FRAME_PING, FRAME_PONG, FRAME_ACK)  # Handled by the reading thread, never returned by recvFrame
+STREAMLESS_FRAMES = (FRAME_HELLO, FRAME_CALL, FRAME_RESULT) + LINK_FRAMES  # Never tagged with a stream ID
+RESUME_UNTRACKED = (FRAME_HELLO, FRAME_PING, FRAME_PONG, FRAME_ACK)  # Neither counted nor sent again by resumed sessions
+FLAG_COMPRESSED = 0x01  # The payload is compressed with the codec chosen in the handshake
+FLAG_MORE = 0x02  # The payload goes on in the next frame of the same channel
+FLAG_STREAM = 0x04  # A stream ID follows the header, see STREAM_ID
+STREAM_ID = struct.Struct("!I")  # Request stream of the frame: the answers of a request are routed back to it by ID
+# Logical channels multiplexed on a connection, in the 2 high bits of the flags.
+CHANNEL_SHIFT = 6
+CHANNEL_CONTROL = 0  # Events, calls and replies
+CHANNEL_BULK = 1  # Files, directories and listings
+CHANNEL_SCREEN = 2  # Screenshots and screen streams
+CHANNEL_PRIORITY = (CHANNEL_CONTROL, CHANNEL_SCREEN, CHANNEL_BULK)  # Most urgent first
+CHANNEL_WINDOW = struct.Struct("!BI")  # Channel, bytes consumed
+CHANNEL_WINDOW_SIZE = 8 * 1024 * 1024  # Bytes of a bulk or screen channel sent ahead of the receiver
+MUX_FRAGMENT_SIZE = 64 * 1024  # Frames are sent in fragments so that urgent channels can cut in
+FLOW_CONTROLLED = (CHANNEL_BULK, CHANNEL_SCREEN)
+BULK_FRAMES = (FRAME_DATA, FRAME_END, FRAME_CHECKSUM, FRAME_STRIPE, FRAME_COPY)  # Sent on CHANNEL_BULK by default
+MAX_HELLO_SIZE = 1024
+FILE_CHUNK_SIZE = 4 * 1024 * 1024  # Default size of the file content frames
+CHUNK_CHECKSUM = struct.Struct("!QQI")  # Chunk number, offset in the file, CRC-32
+MAX_STRIPES = 8  # Maximum number of data connections of a striped transfer
+STRIPE_PROBE_TIME = 1.0  # Seconds measured before adding a data connection in auto mode
+DELTA_HEADER = struct.Struct("!I")  # Block size of the signatures
+DELTA_SIGNATURE = struct.Struct("!I16s")  # Rolling (Adler-32) and strong (BLAKE2b) checksum of a block
+DELTA_COPY = struct.Struct("!QI")  # First block, number of blocks
+# Frame compression codecs: name -> (compress(data, level), decompress(data))
+COMPRESSORS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+    "bz2": (lambda data, level: bz2.compress(data, max(level, 1)), bz2.decompress),
+}
+COMPRESS_MIN_SIZE = 512  # Smaller payloads are never compressed
+COMPRESS_SAMPLE_SIZE = 4096  # Bytes compressed to test whether a payload is worth compressing
+LISTING_PAGE_SIZE = 1000  # Entries per frame of a path listing
+RPC_CALL = struct.Struct("!I")  # Call ID
+HEARTBEAT = struct.Struct("!Q")  # time.monotonic_ns() of the sender
+RESUME_COUNT = struct.Struct("!Q")  # Frames received
+RESUME_BUFFER_SIZE = 16 * 1024 * 1024  # Bytes of sent frames kept until the peer acknowledges them
+RESUME_ACK_FRAMES = 32  # Frames received between two FRAME_ACK
+RESUME_HANDSHAKE_TIMEOUT = 10  # Seconds for the handshake of a connection resuming a session
+RPC_RESULT = struct.Struct("!IB")  # Call ID, status
+RESULT_JSON = 0  # The result is JSON
+RESULT_BYTES = 1  # The result is raw bytes
+RESULT_ERROR = 2  # The handler crashed, the result is the error message
+SCREEN_TILE_SIZE = 64  # Side of the tiles compared by the screen delta frames
+SCREEN_KEYFRAME_INTERVAL = 60  # Frames between two full frames of a screen stream
+SCREEN_TILES = struct.Struct("!I")  # Number of changed tiles of a delta frame
+SCREEN_TILE = struct.Struct("!HH")  # Row, column of a changed tile
+SCREEN_MAX_IN_FLIGHT = 2  # Screen frames requested but not received yet
+SCREEN_SHARE_TIME = 0.03  # Seconds a captured frame is handed out again instead of grabbing a new one
+# Image codecs of the screenshots: name -> PIL format ("raw" is uncompressed RGB, as PPM)
+IMAGE_CODECS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP", "raw": "PPM"}
+IMAGE_QUALITIES = {"low": 40, "medium": 70, "high": 90}  # Quality presets of JPEG and WebP
+ENCODE_INLINE_PIXELS = 256 * 256  # Smaller images are not sent to the encoder processes
+# How listen runs a handler, see eventHandler()
+HANDLER_INLINE = "inline"  # In the listen thread, no other event is read meanwhile
+HANDLER_THREAD = "thread"  # In a thread pool of the connection
+HANDLER_PROCESS = "process"  # In a process pool, for CPU-bound handlers which do not use the connection
+HANDLER_THREADS = 8  # Handlers of a connection running in threads (or waiting for a process) at once
+LISTEN_FRAMES = (FRAME_EVENT, FRAME_CALL, FRAME_RESULT)  # Frames only listen reads while it runs
+HEARTBEAT_TIMEOUT_FACTOR = 3  # Heartbeat intervals without any frame before the peer is considered gone
+FANOUT_CONCURRENCY = 32  # Remote computers called at once by fanOut
+FANOUT_STRAGGLER_FACTOR = 2.0  # Hosts answering that many times slower than the median are stragglers
+METRICS_LATENCY_BUCKETS = (0.001, 0.005, 0.025, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0)  # Seconds, upper bounds of the histograms
+METRICS_PROMETHEUS = "prometheus"  # Text exposition format of Prometheus
+METRICS_JSON = "json"
+METRICS_CONTENT_TYPES = {METRICS_PROMETHEUS: "text/plain; version=0.0.4; charset=utf-8", METRICS_JSON: "application/json"}
+METRICS_HTTP_PORT = 9469
+
 
 class Redirector:
     """
@@ -114,6 +231,206 @@ class RemoteToolkitError(Exception):
         return self.message
 
 
+class FrameReader:
+    """
+    Buffered reader of the frame protocol. Every recv fills the buffer with as
+    many bytes as the system has, and all complete frames in it are parsed before
+    the socket is touched again.
+    """
+
+    def __init__(self, sock: socket.socket, bufferSize=65536):
+        self.sock = sock
+        self._buffer = bytearray(bufferSize)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+        self.decompress = None  # Set once compression is negotiated
+        self.decompressTime = 0.0
+
+    def _recvInto(self, view: memoryview) -> int:
+        n = self.sock.recv_into(view)
+        if not n:
+            raise EOFError("Remote computer closed the connection.")
+        return n
+
+    def _fill(self, size: int):
+        """Make sure at least `size` (<= buffer size) bytes are buffered."""
+        while self._end - self._start < size:
+            if len(self._buffer) - self._start < size:
+                # Move the unread bytes to the front to make room for the rest.
+                remaining = self._end - self._start
+                self._buffer[:remaining] = bytes(self._view[self._start : self._end])
+                self._start, self._end = 0, remaining
+            self._end += self._recvInto(self._view[self._end :])
+
+    def _consume(self, size: int) -> memoryview:
+        data = self._view[self._start : self._start + size]
+        self._start += size
+        if self._start == self._end:
+            self._start = self._end = 0
+        return data
+
+    def readInto(self, view: memoryview):
+        """Fill `view` completely, using buffered bytes first and then the socket."""
+        got = min(len(view), self._end - self._start)
+        view[:got] = self._consume(got)
+        while got < len(view):
+            got += self._recvInto(view[got:])
+
+    def readExactly(self, size: int):
+        """Read `size` bytes. Large payloads are received in place without buffering."""
+        if size <= len(self._buffer):
+            self._fill(size)
+            return bytes(self._consume(size))
+        data = bytearray(size)
+        self.readInto(memoryview(data))
+        return data
+
+    def readHeader(self) -> tuple:
+        """Read a frame header, returns (length, msgType, flags, stream ID or None)."""
+        self._fill(FRAME_HEADER.size)
+        length, msgType, flags = FRAME_HEADER.unpack(self._consume(FRAME_HEADER.size))
+        if not flags & FLAG_STREAM:
+            return length, msgType, flags, None
+        self._fill(STREAM_ID.size)
+        return length, msgType, flags, STREAM_ID.unpack(self._consume(STREAM_ID.size))[0]
+
+    def _decompress(self, payload) -> bytes:
+        if not self.decompress:
+            raise RemoteToolkitError("Compressed frame received but no compression was negotiated.")
+        start = time.thread_time()
+        payload = self.decompress(payload)
+        self.decompressTime += time.thread_time() - start
+        return payload
+
+
+class _SendScheduler:
+    """Hands the socket to the waiting sender of the most urgent channel, one fragment at a time."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._busy = False
+        self._waiting = dict.fromkeys(CHANNEL_PRIORITY, 0)
+
+    def acquire(self, channel: int):
+        urgent = CHANNEL_PRIORITY[: CHANNEL_PRIORITY.index(channel)]
+        with self._cond:
+            self._waiting[channel] += 1
+            while self._busy or any(self._waiting[c] for c in urgent):
+                self._cond.wait()
+            self._waiting[channel] -= 1
+            self._busy = True
+
+    def release(self):
+        with self._cond:
+            self._busy = False
+            self._cond.notify_all()
+
+
+def _running_loop():
+    """The event loop running in this thread, or None."""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _sendfile(sock: socket.socket, file, offset: int, count: int) -> int:
+    """
+    socket.sendfile without its setup (fstat, selector) on each call, which adds up over
+    the fragments of a file: os.sendfile straight on a blocking socket when the system has it.
+    """
+    if not hasattr(os, "sendfile") or sock.gettimeout() is not None:
+        return sock.sendfile(file, offset, count)
+    sent = 0
+    while sent < count:
+        n = os.sendfile(sock.fileno(), file.fileno(), offset + sent, count - sent)
+        if not n:
+            break  # The file is shorter than expected
+        sent += n
+    return sent
+
+
+def _frame_channel(msgType: int) -> int:
+    return CHANNEL_BULK if msgType in BULK_FRAMES else CHANNEL_CONTROL
+
+
+def _assemble_frame(fragments: dict, msgType: int, flags: int, payload):
+    """Put fragmented frames back together: (channel, msgType, flags, payload) once complete, else None."""
+    channel = flags >> CHANNEL_SHIFT
+    if flags & FLAG_MORE:
+        fragments.setdefault(channel, bytearray()).extend(payload)
+        return None
+    if channel in fragments:
+        whole = fragments.pop(channel)
+        whole += payload
+        payload = whole
+    return channel, msgType, flags & ((1 << CHANNEL_SHIFT) - 1) & ~(FLAG_MORE | FLAG_STREAM), payload
+
+
+def _detached_error(error: BaseException) -> BaseException:
+    """
+    A copy of an exception without its traceback, to keep on a connection: the frames of
+    the traceback refer to the connection, which could then only be freed by the cyclic GC.
+    """
+    try:
+        return copy.copy(error).with_traceback(None)
+    except Exception:
+        return RemoteToolkitError(repr(error))
+
+
+def _pack_header(length: int, msgType: int, flags: int, stream) -> bytes:
+    if stream is None:
+        return FRAME_HEADER.pack(length, msgType, flags)
+    return FRAME_HEADER.pack(length, msgType, flags | FLAG_STREAM) + STREAM_ID.pack(stream)
+
+
+def _window_credit(consumed: dict, channel: int, size: int) -> int:
+    """Count bytes consumed on a flow controlled channel, returns the window to give back (0: not yet)."""
+    if channel not in consumed:
+        return 0
+    consumed[channel] += size
+    if consumed[channel] < CHANNEL_WINDOW_SIZE // 4:
+        return 0
+    credit, consumed[channel] = consumed[channel], 0
+    return credit
+
+
+def _drop_frames(consumed: dict, frames, decompress=None) -> list:
+    """
+    Drop frames of a stream nobody reads any more, logging the errors they carry.
+    Returns the FRAME_WINDOW answers giving their window back.
+    """
+    answers = []
+    for frameChannel, msgType, flags, payload, stream in frames:
+        if msgType == FRAME_ABORT:
+            message = decompress(payload) if flags & FLAG_COMPRESSED else payload
+            logging.error(f"Remote Handler Of Stream {stream} Failed: {bytes(message).decode(errors='replace')}")
+        credit = _window_credit(consumed, frameChannel, len(payload))
+        if credit:
+            answers.append((FRAME_WINDOW, CHANNEL_WINDOW.pack(frameChannel, credit)))
+    return answers
+
+
+def _latency_stats() -> dict:
+    return {"samples": 0, "rtt": None, "rttLast": None, "rttMin": None, "rttMax": None, "jitter": 0.0}
+
+
+def _add_rtt(stats: dict, payload):
+    """Add the round trip time of a FRAME_PONG to the latency statistics of a connection."""
+    rtt = (time.monotonic_ns() - HEARTBEAT.unpack(payload)[0]) / 1e9
+    if stats["samples"]:
+        # Smoothed like TCP (RFC 6298), jitter like RTP (RFC 3550).
+        stats["rtt"] += (rtt - stats["rtt"]) / 8
+        stats["jitter"] += (abs(rtt - stats["rttLast"]) - stats["jitter"]) / 16
+        stats["rttMin"] = min(stats["rttMin"], rtt)
+        stats["rttMax"] = max(stats["rttMax"], rtt)
+    else:
+        stats["rtt"] = stats["rttMin"] = stats["rttMax"] = rtt
+    stats["rttLast"] = rtt
+    stats["samples"] += 1
+
+
 def _debugWindow(remote):
     global text2
     debugHelperWindow = tkinter.Tk()
@@ -139,6 +456,380 @@ def _check_version(version: str):
     return (vi[0] == vc[0]) and (vi[1] == vc[1])
 
 
+def _hello_message(host: str, **fields) -> str:
+    msg = f"Answer! Remote Connection Toolkit version {__version__},server ip: {host}"
+    return msg + "".join(f",{key}: {value}" for key, value in fields.items())
+
+
+def _hello_fields(msg: str) -> dict:
+    """The "key: value" fields of a handshake message."""
+    return dict(part.split(": ", 1) for part in msg.split(",")[1:] if ": " in part)
+
+
+def _check_client_answer(msg: str):
+    """Check the handshake answer of a client, raise RemoteToolkitError if unsupported."""
+    ver = re.search(r"\d+\.\d+\.\d+", msg)
+    logging.debug(f"Received Version: {ver and ver[0]}")
+    if msg and "Answer! Remote Connection Toolkit version" in msg and ver and _check_version(ver[0]):
+        logging.info(f"Client Answered: {msg}")
+    else:
+        logging.error(f"Unsupported Client Interface (Client Answer: {msg})")
+        raise RemoteToolkitError(f"Unsupported Client Interface (Client Answer: {msg})")
+
+
+def _split_event(payload) -> tuple:
+    """Split an event frame payload "EventKeyWord|arg1,arg2,..." into (name, args)."""
+    funcRE, _, argStr = bytes(payload).decode().partition("|")
+    return funcRE, argStr.split(",")
+
+
+def _call_payload(callId: int, name: str, args: tuple) -> bytes:
+    return RPC_CALL.pack(callId) + f"{name}|{','.join(map(str, args))},".encode()
+
+
+def _result_payload(callId: int, value=None, error: Exception = None) -> bytes:
+    """FRAME_RESULT payload of a handler return value, or of the exception it raised."""
+    if error is not None:
+        return RPC_RESULT.pack(callId, RESULT_ERROR) + str(error).encode()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return RPC_RESULT.pack(callId, RESULT_BYTES) + bytes(value)
+    return RPC_RESULT.pack(callId, RESULT_JSON) + json.dumps(value, default=str).encode()
+
+
+def _set_result(future, payload):
+    """Complete the future of a call with its FRAME_RESULT payload."""
+    callId, status = RPC_RESULT.unpack_from(payload)
+    if future is None or future.done():
+        logging.debug(f"Ignored Result Of Call {callId}, Nobody Waits For It")
+        return
+    result = bytes(payload[RPC_RESULT.size:])
+    if status == RESULT_ERROR:
+        future.set_exception(RemoteToolkitError(f"Remote call failed: {result.decode()}"))
+    elif status == RESULT_BYTES:
+        future.set_result(result)
+    else:
+        future.set_result(json.loads(result))
+
+
+_loggingReady = False
+
+
+def _setup_logging():
+    """Log to the terminal and to WRemoteConnection.logging.log, once per process."""
+    global _loggingReady
+    if _loggingReady:
+        return
+    _loggingReady = True
+    logger = logging.getLogger()
+    format_str = logging.Formatter(
+        "(Remote Connection: %(asctime)s) [%(levelname)s]: %(message)s"
+    )
+    logger.setLevel(logging.DEBUG)
+    sh = logging.StreamHandler()
+    sh.setFormatter(format_str)
+    th = logging.FileHandler(
+        filename="WRemoteConnection.logging.log", encoding="utf-8"
+    )
+    th.setFormatter(format_str)
+    logging.basicConfig(
+        level=logging.DEBUG,
+        handlers=[sh, th],
+    )
+    sys.stderr = open("WRemoteConnection.stderr.log", "a", encoding="utf-8")
+
+
+# [bytes received, bytes sent] by the handler running in this thread or task.
+_event_traffic = contextvars.ContextVar("_event_traffic", default=None)
+
+
+def _add_event_traffic(direction: int, size: int):
+    traffic = _event_traffic.get()
+    if traffic is not None:
+        traffic[direction] += size
+
+
+# (connection, stream ID) of the request or handler running in this thread or task.
+_stream_context = contextvars.ContextVar("_stream_context", default=None)
+
+
+def _stream_of(remote):
+    """Stream of `remote` the running request or handler uses, None outside of one."""
+    current = _stream_context.get()
+    return current[1] if current is not None and current[0] is remote else None
+
+
+@contextlib.contextmanager
+def _request_stream(remote):
+    """
+    Run a request in a stream of its own: its frames carry the stream ID, and the frames
+    the remote handler answers with are routed back to it only. Requests made inside a
+    stream, by a handler or another request, go on in that stream.
+    """
+    if _stream_of(remote) is not None:
+        yield
+        return
+    stream = remote._openStream()
+    token = _stream_context.set((remote, stream))
+    try:
+        yield
+    finally:
+        _stream_context.reset(token)
+        remote._closeStream(stream)
+
+
+@contextlib.contextmanager
+def _handler_stream(remote, stream):
+    """Run a handler in the stream its event came in, which was opened when it arrived."""
+    if stream is None:
+        yield
+        return
+    token = _stream_context.set((remote, stream))
+    try:
+        yield
+    finally:
+        _stream_context.reset(token)
+        remote._closeStream(stream)
+
+
+class MetricsRegistry:
+    """
+    Metrics of the handlers and the connections of the process: calls, errors, latency
+    histogram and bytes of every event, bytes and queue depths of every connection.
+    snapshot() reads them all, MetricsExporter publishes them.
+    """
+
+    def __init__(self, buckets=METRICS_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._events = {}  # Event name -> counters of its ended calls
+        self._running = {}  # Event name -> {id: [bytes in, bytes out]} of its running calls
+        self._connections = weakref.WeakSet()
+        self._retired = {"bytesIn": 0, "bytesOut": 0}  # Traffic of the connections gone
+        self._gone = collections.deque()  # trafficStats of the connections retired since the last snapshot
+        self._connectionIds = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def track(self, remote):
+        """Count the traffic of a connection in remote.trafficStats, and read it in the snapshots."""
+        remote.trafficStats = {"bytesIn": 0, "bytesOut": 0}
+        remote.metricsId = next(self._connectionIds)
+        with self._lock:
+            self._connections.add(remote)
+        # The finalizer may run in a garbage collection of a thread holding _lock: it must not take it.
+        remote._metricsRetire = weakref.finalize(remote, self._gone.append, remote.trafficStats)
+
+    def retire(self, remote):
+        """Stop reading a closed connection, keeping its traffic in the totals."""
+        with self._lock:
+            self._connections.discard(remote)
+            remote._metricsRetire()
+
+    def _collectGone(self):
+        # Holding _lock.
+        while self._gone:
+            traffic = self._gone.popleft()
+            for key in self._retired:
+                self._retired[key] += traffic[key]
+
+    def eventStarted(self, name: str) -> tuple:
+        """Count a call of the handler `name`, returns the token of eventEnded()."""
+        traffic = [0, 0]
+        with self._lock:
+            if name not in self._events:
+                self._events[name] = {
+                    "calls": 0, "errors": 0, "seconds": 0.0, "bytesIn": 0, "bytesOut": 0,
+                    "buckets": [0] * (len(self.buckets) + 1),
+                }
+            self._events[name]["calls"] += 1
+            self._running.setdefault(name, {})[id(traffic)] = traffic
+        return time.perf_counter(), traffic, _event_traffic.set(traffic)
+
+    def eventEnded(self, name: str, token: tuple, failed=False):
+        start, traffic, contextToken = token
+        seconds = time.perf_counter() - start
+        _event_traffic.reset(contextToken)
+        with self._lock:
+            event = self._events[name]
+            del self._running[name][id(traffic)]
+            event["errors"] += failed
+            event["seconds"] += seconds
+            event["buckets"][bisect.bisect_left(self.buckets, seconds)] += 1
+            event["bytesIn"] += traffic[0]
+            event["bytesOut"] += traffic[1]
+
+    def snapshot(self) -> dict:
+        """All the metrics, counted since the process started."""
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        events = {}
+        with self._lock:
+            for name, event in self._events.items():
+                running = list(self._running[name].values())
+                counts = list(itertools.accumulate(event["buckets"]))
+                events[name] = {
+                    "calls": event["calls"],
+                    "errors": event["errors"],
+                    "running": len(running),
+                    "bytesIn": event["bytesIn"] + sum(traffic[0] for traffic in running),
+                    "bytesOut": event["bytesOut"] + sum(traffic[1] for traffic in running),
+                    "latency": {"buckets": dict(zip(bounds, counts)), "sum": event["seconds"], "count": counts[-1]},
+                }
+            remotes = list(self._connections)
+            self._collectGone()
+            total = dict(self._retired)
+        connections = {}
+        for remote in remotes:
+            for key in total:
+                total[key] += remote.trafficStats[key]
+            if remote.connect and remote.connectMode != "unconnect":
+                connections[str(remote.metricsId)] = {
+                    "peer": f"{getattr(remote, 'clientAddress', remote.remoteIP)}:{getattr(remote, 'clientPort', remote.port)}",
+                    "mode": remote.connectMode,
+                    **remote.trafficStats,
+                    "queues": remote.getQueueDepths(),
+                }
+        return {"time": time.time(), **total, "events": events, "connections": connections}
+
+
+# Metrics of every connection and handler of the process.
+metrics_registry = MetricsRegistry()
+
+
+def _prometheus_escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prometheus_text(snapshot: dict) -> str:
+    """A snapshot of MetricsRegistry in the text exposition format of Prometheus."""
+    lines = []
+    directions = (("in", "bytesIn"), ("out", "bytesOut"))
+
+    def metric(name: str, kind: str, description: str, samples):
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            labelText = ",".join(f'{key}="{_prometheus_escape(label)}"' for key, label in labels.items())
+            lines.append(f"{name}{suffix}{{{labelText}}} {value}")
+
+    events, connections = snapshot["events"], snapshot["connections"]
+    metric(
+        "remote_bytes_total", "counter", "Bytes of the frames received and sent by all the connections.",
+        [("", {"direction": direction}, snapshot[key]) for direction, key in directions],
+    )
+    metric("remote_event_calls_total", "counter", "Handler calls.", [("", {"event": n}, e["calls"]) for n, e in events.items()])
+    metric(
+        "remote_event_errors_total", "counter", "Handler calls which raised an exception.",
+        [("", {"event": n}, e["errors"]) for n, e in events.items()],
+    )
+    metric("remote_event_running", "gauge", "Handlers running.", [("", {"event": n}, e["running"]) for n, e in events.items()])
+    metric(
+        "remote_event_bytes_total", "counter", "Bytes of the frames received and sent by the handlers.",
+        [("", {"event": n, "direction": direction}, e[key]) for n, e in events.items() for direction, key in directions],
+    )
+    histogram = []
+    for n, e in events.items():
+        histogram += [("_bucket", {"event": n, "le": bound}, count) for bound, count in e["latency"]["buckets"].items()]
+        histogram += [("_sum", {"event": n}, e["latency"]["sum"]), ("_count", {"event": n}, e["latency"]["count"])]
+    metric("remote_event_duration_seconds", "histogram", "Duration of the handler calls.", histogram)
+    metric(
+        "remote_connection_bytes_total", "counter", "Bytes of the frames received and sent by a connection.",
+        [
+            ("", {"connection": id, "peer": c["peer"], "direction": direction}, c[key])
+            for id, c in connections.items()
+            for direction, key in directions
+        ],
+    )
+    metric(
+        "remote_connection_queue_depth", "gauge", "Frames, handlers or sessions waiting in a queue of a connection.",
+        [
+            ("", {"connection": id, "peer": c["peer"], "queue": queueName}, depth)
+            for id, c in connections.items()
+            for queueName, depth in c["queues"].items()
+        ],
+    )
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """
+    Publish the snapshots of a MetricsRegistry (metrics_registry by default) as Prometheus
+    text or JSON: written to a file, served over HTTP for a scraper, or pushed to a URL.
+    """
+
+    def __init__(self, registry: MetricsRegistry = None, format=METRICS_PROMETHEUS):
+        self.registry = registry or metrics_registry
+        self.format = format
+        self._stop = threading.Event()
+        self._server = None
+
+    def render(self, format=None) -> str:
+        snapshot = self.registry.snapshot()
+        if (format or self.format) == METRICS_JSON:
+            return json.dumps(snapshot, indent=1)
+        return _prometheus_text(snapshot)
+
+    def writeFile(self, path: str, format=None):
+        """Write a snapshot to path, replaced at once so that readers never see half of it."""
+        temp = f"{path}.tmp"
+        with open(temp, "w", encoding="utf-8") as file:
+            file.write(self.render(format))
+        os.replace(temp, path)
+
+    def startFile(self, path: str, interval=15.0, format=None):
+        """Write a snapshot to path every interval seconds, in a thread, until stop()."""
+
+        def export():
+            while True:
+                try:
+                    self.writeFile(path, format)
+                except OSError as e:
+                    logging.warning(f"Can't Write Metrics To {path}: {e}")
+                if self._stop.wait(interval):
+                    return
+
+        threading.Thread(target=export, name="RemoteMetricsFile", daemon=True).start()
+
+    def serveHttp(self, port=METRICS_HTTP_PORT, host="127.0.0.1") -> int:
+        """Serve /metrics (Prometheus text) and /metrics.json in a thread until stop(), returns the port."""
+        exporter = self
+
+        class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                format = {"/metrics": METRICS_PROMETHEUS, "/metrics.json": METRICS_JSON}.get(self.path.split("?")[0])
+                if format is None:
+                    self.send_error(404)
+                    return
+                body = exporter.render(format).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", METRICS_CONTENT_TYPES[format])
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug(f"Metrics Request: {format % args}")
+
+        self._server = http.server.ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        threading.Thread(target=self._server.serve_forever, name="RemoteMetricsHttp", daemon=True).start()
+        logging.info(f"Serving Metrics On http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server.server_address[1]
+
+    def pushHttp(self, url: str, format=None, timeout=10):
+        """POST a snapshot to an HTTP endpoint, like a Prometheus Pushgateway."""
+        format = format or self.format
+        request = urllib.request.Request(
+            url, self.render(format).encode(), {"Content-Type": METRICS_CONTENT_TYPES[format]}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=timeout):
+            pass
+
+    def stop(self):
+        """Stop writing the file and serving HTTP."""
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
 class RemoteConnection:
     def __init__(self, remoteIP: str, port=4469, debugGUI=False):
         if debugGUI:
@@ -151,44 +842,619 @@ class RemoteConnection:
             )
         else:
             self.logger = logging.getLogger()
-            format_str = logging.Formatter(
-                "(Remote Connection: %(asctime)s) [%(levelname)s]: %(message)s"
-            )
-            self.logger.setLevel(logging.DEBUG)
-            sh = logging.StreamHandler()
-            sh.setFormatter(format_str)
-            th = logging.FileHandler(
-                filename="WRemoteConnection.logging.log", encoding="utf-8"
-            )
-            th.setFormatter(format_str)
-            logging.basicConfig(
-                level=logging.DEBUG,
-                handlers=[sh, th],
-            )
-            sys.stderr = open("WRemoteConnection.stderr.log", "a", encoding="utf-8")
+            _setup_logging()
 
         logging.info("Starting Remote Connection...")
+        self._initState(remoteIP, port)
+        logging.info("Complete initialization")
 
+    def _initState(self, remoteIP: str, port: int, sock=None):
         self.connect = True
         self.connectMode = "unconnect"
-        self.socketObject = socket.socket()
+        self.socketObject = sock or socket.socket()
+        self.reader = None
+        self._sendLock = threading.Lock()
+        self._scheduler = _SendScheduler()
+        self._channelLocks = {channel: threading.Lock() for channel in CHANNEL_PRIORITY}
+        self.windows = dict.fromkeys(FLOW_CONTROLLED, CHANNEL_WINDOW_SIZE)  # Bytes each channel may still send
+        self._recvCond = threading.Condition()
+        self._reading = False
+        self._recvError = None
+        self._pending = collections.deque()  # Complete frames received for another reader
+        self._streams = {}  # Stream ID -> complete frames received for the request or handler of that stream
+        self._streamUsers = {}  # Stream ID -> requests and handlers using it
+        self._streamIds = itertools.count()
+        self._fragments = {}  # Channel -> (buffer, bytes used) of the frame being reassembled
+        self._frameSizes = {}  # Channel -> size of its last fragmented frame, to size the next buffer
+        self._consumed = dict.fromkeys(FLOW_CONTROLLED, 0)
+        self.fileChunkSize = FILE_CHUNK_SIZE
+        self.compression = None  # Preferred codec of COMPRESSORS, set before connecting
+        self.compressionLevel = 6
+        self.codec = None  # Codec negotiated in the handshake
+        self.compressionStats = {"frames": 0, "skipped": 0, "bytesIn": 0, "bytesOut": 0, "cpuTime": 0.0}
         self.remoteIP = remoteIP
         self.host = socket.gethostname()
         self.port = port
-
-        logging.info("Complete initialization")
+        self.state = {}  # Free for handlers to keep per-connection data
+        self.peerHello = {}  # Fields of the handshake answer of the client
+        self.server = None  # The serving RemoteConnection of a server mode session
+        self.listening = False
+        self._calls = {}  # Call ID -> Future of the calls waiting for their result
+        self._callIds = itertools.count(1)
+        self._callsLock = threading.Lock()
+        self.handlerThreads = HANDLER_THREADS
+        self._running = 0  # Handlers dispatched to threads which did not end yet
+        self.heartbeatInterval = 0  # Seconds between two pings while listening, 0: no heartbeat
+        self.heartbeatTimeout = None  # Seconds without any frame before closing, default: 3 intervals
+        self.latencyStats = _latency_stats()
+        self.lastReceived = time.monotonic()  # When the last frame arrived
+        self.autoReconnect = False  # Client: reconnect and resume the session when the connection drops
+        self.reconnectDelay = 0.5  # Seconds before the first reconnection attempt, doubled after each failure
+        self.reconnectMaxDelay = 30.0
+        self.reconnectTimeout = 120.0  # Seconds to reconnect, or to wait for the client to come back, before giving up
+        self.resumeBufferSize = RESUME_BUFFER_SIZE
+        self.sessionId = None  # Set when the session can be resumed
+        self._generation = 0  # Times the connection of the session was replaced
+        self._resuming = False
+        self._resumeFailed = False
+        self._sent = self._received = self._acked = 0  # Frames sent, received, and acknowledged to the peer
+        self._kept = collections.deque()  # (number, frame) of the frames the peer did not acknowledge yet
+        self._keptSize = 0
+        self._keptLock = threading.Lock()
+        metrics_registry.track(self)
 
     def getLocalAddress(self) -> str:
         return self.host
 
-    def send(self, msg) -> int:
-        if self.connectMode == "passiveConnect":
-            return self.clientObject.send(msg)
-        else:
-            return self.socketObject.send(msg)
+    def _connectionSocket(self) -> socket.socket:
+        return self.clientObject if self.connectMode == "passiveConnect" else self.socketObject
 
-    def sendString(self, msg: str) -> int:
-        return self.send(msg.encode())
+    def _compress(self, payload) -> tuple:
+        """Returns (compressed payload or None if it is not worth it, CPU time)."""
+        start = time.thread_time()
+        # Sample the beginning and the middle: compressing already compressed
+        # data (PNG, archives...) would only waste CPU.
+        sample = bytes(payload[:COMPRESS_SAMPLE_SIZE // 2]) + bytes(
+            payload[len(payload) // 2 : len(payload) // 2 + COMPRESS_SAMPLE_SIZE // 2]
+        )
+        compressed = None
+        if len(zlib.compress(sample, 1)) < len(sample) * 0.9:
+            compressed = COMPRESSORS[self.codec][0](payload, self.compressionLevel)
+            if len(compressed) >= len(payload):
+                compressed = None
+        return compressed, time.thread_time() - start
+
+    def sendFrame(self, msgType: int, payload=b"", flags=0, channel=None) -> int:
+        """
+        Send one frame on a logical channel (by default bulk for data frames, control for
+        the others), returns the payload length. Big payloads are sent in fragments, and
+        fragments of more urgent channels are sent in between.
+        """
+        channel = _frame_channel(msgType) if channel is None else channel
+        size = len(payload)
+        if self.codec and size >= COMPRESS_MIN_SIZE:
+            compressed, cpuTime = self._compress(payload)
+            with self._sendLock:
+                stats = self.compressionStats
+                stats["cpuTime"] += cpuTime
+                stats["bytesIn"] += size
+                if compressed is None:
+                    stats["skipped"] += 1
+                    stats["bytesOut"] += size
+                else:
+                    stats["frames"] += 1
+                    stats["bytesOut"] += len(compressed)
+                    payload, flags = compressed, flags | FLAG_COMPRESSED
+        view = memoryview(payload)
+        flags |= channel << CHANNEL_SHIFT
+        stream = None if msgType in STREAMLESS_FRAMES else _stream_of(self)
+        # The fragments of a frame never interleave with another frame of the same channel.
+        with self._channelLocks[channel]:
+            self._takeWindow(channel, len(view))
+            for start in range(0, max(len(view), 1), MUX_FRAGMENT_SIZE):
+                fragment = view[start : start + MUX_FRAGMENT_SIZE]
+                more = FLAG_MORE if start + MUX_FRAGMENT_SIZE < len(view) else 0
+                self._sendWire(channel, msgType, _pack_header(len(fragment), msgType, flags | more, stream), fragment)
+        return size
+
+    def _sendWire(self, channel: int, msgType: int, header: bytes, fragment):
+        """
+        Send one frame on the socket once the scheduler lets its channel go. The frames of
+        a resumable session are kept until acknowledged, and survive a lost connection.
+        """
+        self._scheduler.acquire(channel)
+        try:
+            generation = self._generation
+            sock = self._connectionSocket()
+            if self.sessionId and msgType not in RESUME_UNTRACKED:
+                frame = header + bytes(fragment)
+                self._keep(frame)
+                sock.sendall(frame)
+            elif len(fragment) < 4096:
+                sock.sendall(header + bytes(fragment))
+            else:
+                sock.sendall(header)
+                sock.sendall(fragment)
+            self.trafficStats["bytesOut"] += len(header) + len(fragment)
+            _add_event_traffic(1, len(header) + len(fragment))
+            return
+        except OSError as e:
+            error = e
+        finally:
+            self._scheduler.release()
+        # A kept frame is sent again by the resumed session.
+        if msgType in RESUME_UNTRACKED or not self._recover(error, generation):
+            raise error
+
+    def _keep(self, frame: bytes):
+        """Keep a sent frame until the peer acknowledges it, dropping the oldest beyond resumeBufferSize."""
+        with self._keptLock:
+            self._sent += 1
+            self._kept.append((self._sent, frame))
+            self._keptSize += len(frame)
+            while self._keptSize > self.resumeBufferSize:
+                self._keptSize -= len(self._kept.popleft()[1])
+
+    def _acknowledged(self, count: int):
+        with self._keptLock:
+            while self._kept and self._kept[0][0] <= count:
+                self._keptSize -= len(self._kept.popleft()[1])
+
+    def _canReplay(self, peerReceived: int) -> bool:
+        """Whether every frame after the first `peerReceived` ones is still kept."""
+        with self._keptLock:
+            first = self._kept[0][0] if self._kept else self._sent + 1
+            return first - 1 <= peerReceived <= self._sent
+
+    def sendFrameFromFile(self, file, offset: int, count: int, msgType=FRAME_DATA, flags=0) -> int:
+        """
+        Send one frame whose payload is `count` bytes of a regular file, with
+        socket.sendfile. With compression the content is read and compressed instead.
+        """
+        if self.codec or self.sessionId:
+            # Compressed or kept for a resumption: the content must go through Python.
+            file.seek(offset)
+            return self.sendFrame(msgType, file.read(count), flags)
+        sock = self._connectionSocket()
+        channel = _frame_channel(msgType)
+        flags |= channel << CHANNEL_SHIFT
+        stream = _stream_of(self)
+        with self._channelLocks[channel]:
+            self._takeWindow(channel, count)
+            for start in range(0, max(count, 1), MUX_FRAGMENT_SIZE):
+                n = min(MUX_FRAGMENT_SIZE, count - start)
+                more = FLAG_MORE if start + n < count else 0
+                header = _pack_header(n, msgType, flags | more, stream)
+                self._scheduler.acquire(channel)
+                try:
+                    sock.sendall(header)
+                    sent = _sendfile(sock, file, offset + start, n) if n else 0
+                finally:
+                    self._scheduler.release()
+                if sent != n:
+                    # The frame is cut, so the connection can not be used any more.
+                    raise RemoteToolkitError(f"File {file.name} was truncated while sending it.")
+                self.trafficStats["bytesOut"] += len(header) + n
+                _add_event_traffic(1, len(header) + n)
+        return count
+
+    def send(self, msg, msgType=FRAME_DATA, channel=None) -> int:
+        return self.sendFrame(msgType, msg, channel=channel)
+
+    def sendString(self, msg: str, msgType=FRAME_EVENT) -> int:
+        return self.send(msg.encode(), msgType)
+
+    def recvFrame(self, channel=None) -> tuple:
+        """
+        Receive the next frame of a logical channel, or of any channel, returns (msgType, flags, payload).
+        Frames of other channels arriving meanwhile are kept for their readers. While listen
+        runs, events, calls and call results are left to it. Inside a request or a handler,
+        only the frames of its stream are received, and a FRAME_ABORT of the stream raises
+        RemoteToolkitError.
+        """
+        stream = _stream_of(self)
+
+        def wanted(frameChannel: int, msgType: int) -> bool:
+            if stream is not None:
+                return channel is None or frameChannel == channel or msgType == FRAME_ABORT
+            return (channel is None or frameChannel == channel) and not (self.listening and msgType in LISTEN_FRAMES)
+
+        msgType, flags, payload, _ = self._recvMatching(wanted, stream)
+        if msgType == FRAME_ABORT:
+            raise RemoteToolkitError(f"The remote handler failed: {bytes(payload).decode(errors='replace')}")
+        return msgType, flags, payload
+
+    def _recvMatching(self, wanted, stream=None) -> tuple:
+        """
+        Receive the next frame of a stream (default: the frames of no stream) for which
+        wanted(channel, msgType) is true, returns (msgType, flags, payload, stream).
+        """
+        with self._recvCond:
+            frames = self._pending if stream is None else self._streams[stream]
+            while True:
+                for index, frame in enumerate(frames):
+                    if wanted(frame[0], frame[1]):
+                        del frames[index]
+                        break
+                else:
+                    self._receive()
+                    continue
+                break
+            frameChannel, msgType, flags, payload, frameStream = frame
+            credit = _window_credit(self._consumed, frameChannel, len(payload))
+        _add_event_traffic(0, FRAME_HEADER.size + len(payload))
+        if credit:
+            try:
+                self.sendFrame(FRAME_WINDOW, CHANNEL_WINDOW.pack(frameChannel, credit))
+            except OSError:
+                pass  # The connection is lost, the next read tells it
+        if flags & FLAG_COMPRESSED:
+            payload = self.reader._decompress(payload)
+            flags &= ~FLAG_COMPRESSED
+        return msgType, flags, payload, frameStream
+
+    def _readFragment(self, channel: int, msgType: int, flags: int, length: int):
+        """
+        Read a fragment straight into the buffer of its channel, without copying it again
+        to put the frame together. The buffer is sized like the last fragmented frame of
+        the channel, and doubled when it is too small. Returns the frame once complete, else None.
+        """
+        buffer, used = self._fragments.get(channel) or (bytearray(self._frameSizes.get(channel, 0)), 0)
+        if used + length > len(buffer):
+            buffer.extend(bytes(max(used + length - len(buffer), len(buffer))))
+        with memoryview(buffer)[used : used + length] as view:
+            self.reader.readInto(view)
+        used += length
+        if flags & FLAG_MORE:
+            self._fragments[channel] = (buffer, used)
+            return None
+        del self._fragments[channel]
+        self._frameSizes[channel] = used
+        del buffer[used:]
+        return channel, msgType, flags & ((1 << CHANNEL_SHIFT) - 1) & ~(FLAG_MORE | FLAG_STREAM), buffer
+
+    def _openStream(self, stream=None) -> int:
+        """Route the frames of a stream (default: a new one) to a queue of its own until _closeStream, returns its ID."""
+        with self._recvCond:
+            if stream is None:
+                # Odd IDs for the streams of the client, even ones for the server: they never collide.
+                stream = (2 * next(self._streamIds) + (self.connectMode == "initiativeConnect")) & 0xFFFFFFFF
+            self._streamUsers[stream] = self._streamUsers.get(stream, 0) + 1
+            self._streams.setdefault(stream, collections.deque())
+        return stream
+
+    def _closeStream(self, stream: int):
+        """Done with a stream: once its last user is, the frames of it nobody read are dropped."""
+        with self._recvCond:
+            self._streamUsers[stream] -= 1
+            if self._streamUsers[stream]:
+                return
+            del self._streamUsers[stream]
+            answers = _drop_frames(self._consumed, self._streams.pop(stream), self.reader._decompress)
+        for answer in answers:
+            try:
+                self.sendFrame(*answer)
+            except OSError:
+                pass  # The connection is lost, the next read tells it
+
+    def _route(self, frame: tuple) -> list:
+        """
+        Holding _recvCond: queue a received frame for its reader, returns the answers to send.
+        Events of a stream open it for their handler, other frames of a closed stream are dropped.
+        """
+        stream = frame[4]
+        if stream is None or frame[1] == FRAME_EVENT:
+            if stream is not None and self.listening:
+                self._openStream(stream)
+            self._pending.append(frame)
+        elif stream in self._streams:
+            self._streams[stream].append(frame)
+        else:
+            return _drop_frames(self._consumed, [frame], self.reader._decompress)
+        return []
+
+    def _receive(self):
+        """
+        Holding _recvCond: read the next frame from the socket, or wait while another thread
+        does. Every thread waiting for a frame or for window can read for the others.
+        """
+        if self._recvError is not None:
+            raise copy.copy(self._recvError)
+        if self._reading or self._resuming:
+            self._recvCond.wait()
+            return
+        generation = self._generation
+        self._reading = True
+        self._recvCond.release()
+        error = None
+        partial = False  # Only a fragment was read: nothing for the waiting threads yet
+        try:
+            length, msgType, flags, stream = self.reader.readHeader()
+            channel = flags >> CHANNEL_SHIFT
+            if msgType not in LINK_FRAMES and (flags & FLAG_MORE or channel in self._fragments):
+                frame = self._readFragment(channel, msgType, flags, length)
+            else:
+                payload = self.reader.readExactly(length)
+                frame = None if msgType in LINK_FRAMES else _assemble_frame(self._fragments, msgType, flags, payload)
+            self.lastReceived = time.monotonic()
+            self.trafficStats["bytesIn"] += FRAME_HEADER.size + length + (stream is not None and STREAM_ID.size)
+            partial = frame is None and msgType not in LINK_FRAMES
+        except (EOFError, OSError) as e:
+            error = e
+        except BaseException as e:
+            self._recvError = _detached_error(e)
+            raise
+        finally:
+            self._recvCond.acquire()
+            self._reading = False
+            if not partial:
+                # Waking every waiting thread for each fragment would cost a thread switch per fragment.
+                self._recvCond.notify_all()
+        if error is not None:
+            self._recvCond.release()
+            try:
+                resumed = self._recover(error, generation)
+            finally:
+                self._recvCond.acquire()
+            if not resumed:
+                self._recvError = _detached_error(error)
+                raise error
+            return
+        answers = []
+        if msgType not in RESUME_UNTRACKED:
+            self._received += 1
+            if self.sessionId and self._received - self._acked >= RESUME_ACK_FRAMES:
+                self._acked = self._received
+                answers.append((FRAME_ACK, RESUME_COUNT.pack(self._received)))
+        if msgType == FRAME_WINDOW:
+            windowChannel, credit = CHANNEL_WINDOW.unpack(payload)
+            self.windows[windowChannel] += credit
+        elif msgType == FRAME_PONG:
+            _add_rtt(self.latencyStats, payload)
+        elif msgType == FRAME_PING:
+            answers.append((FRAME_PONG, payload))
+        elif msgType == FRAME_ACK:
+            self._acknowledged(RESUME_COUNT.unpack(payload)[0])
+        elif frame is not None:
+            answers += self._route(frame + (stream,))
+        if answers:
+            # Sent without holding the lock, so that another thread can read meanwhile.
+            self._recvCond.release()
+            try:
+                for answer in answers:
+                    self.sendFrame(*answer)
+            except OSError:
+                pass  # The connection is lost, the next read tells it
+            finally:
+                self._recvCond.acquire()
+
+    def _recover(self, error: Exception, generation: int) -> bool:
+        """
+        The connection of `generation` failed with `error`: resume the session on a new
+        connection, or wait while another thread does. False if it can not be resumed.
+        """
+        if not (self.sessionId and self.connect):
+            return False
+        with self._recvCond:
+            while self._resuming:
+                self._recvCond.wait()
+            if self._generation != generation:
+                return True
+            if self._resumeFailed:
+                return False
+            self._resuming = True
+            try:
+                self._connectionSocket().shutdown(socket.SHUT_RDWR)  # Wakes up the threads still using it
+            except OSError:
+                pass
+            # The frames received so far are counted once no thread reads any more.
+            while self._reading:
+                self._recvCond.wait()
+        logging.warning(f"Connection Lost, Resuming Session {self.sessionId}: {error}")
+        resumed = False
+        try:
+            link, peerReceived = self._reconnect() if self.connectMode == "initiativeConnect" else self._awaitClient()
+            if link is not None:
+                self._adopt(link, peerReceived)
+                resumed = True
+        except (OSError, RemoteToolkitError) as e:
+            logging.error(f"Session {self.sessionId} Can Not Be Resumed: {e}")
+        finally:
+            with self._recvCond:
+                self._resuming = False
+                self._resumeFailed = not resumed
+                self._recvCond.notify_all()
+        return resumed
+
+    def _reconnect(self) -> tuple:
+        """Connect again with exponential backoff, returns (connection, frames the server received) or (None, 0)."""
+        deadline = time.monotonic() + self.reconnectTimeout
+        delay = self.reconnectDelay
+        while self.connect:
+            link = type(self).__new__(type(self))
+            link._initState(self.remoteIP, self.port)
+            link.host, link.compression = self.host, self.codec
+            try:
+                link.socketObject.settimeout(RESUME_HANDSHAKE_TIMEOUT)
+                link.socketObject.connect((self.remoteIP, self.port))
+                link.connectMode = "initiativeConnect"
+                link.clientObject = link.socketObject
+                link.reader = FrameReader(link.clientObject)
+                if link._clientHandshake(RESUME_HANDSHAKE_TIMEOUT, resume=self.sessionId, received=self._received):
+                    link.clientObject.settimeout(RESUME_HANDSHAKE_TIMEOUT)
+                    answer = _hello_fields(link._recvHello())
+                    link.clientObject.settimeout(None)
+                    if "resumed" not in answer:
+                        link.clientObject.close()
+                        raise RemoteToolkitError(f"The remote computer refused to resume: {answer.get('refused')}")
+                    return link, int(answer["resumed"])
+            except OSError as e:
+                logging.info(f"Reconnection Failed: {e}")
+            link.socketObject.close()
+            if time.monotonic() + delay > deadline:
+                break
+            # Jitter, so that the clients of a restarted server do not all come back at once.
+            time.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, self.reconnectMaxDelay)
+        return None, 0
+
+    def _awaitClient(self) -> tuple:
+        """Wait for the client to come back, returns (connection, frames the client received) or (None, 0)."""
+        link = None
+        deadline = time.monotonic() + self.reconnectTimeout
+        if self.server is not None:
+            # The serving loop hands over the connections resuming this session.
+            links = self.server._resumeQueue(self.sessionId)
+            try:
+                while link is None and self.connect and time.monotonic() < deadline:
+                    try:
+                        link = links.get(timeout=min(deadline - time.monotonic(), 1.0))
+                    except queue.Empty:
+                        pass
+            finally:
+                with self.server._sessionsLock:
+                    self.server._resumeLinks.pop(self.sessionId, None)
+        else:
+            while link is None and self.connect and time.monotonic() < deadline:
+                self.socketObject.settimeout(min(deadline - time.monotonic(), 1.0))
+                try:
+                    sock, addr = self.socketObject.accept()
+                except socket.timeout:
+                    continue
+                finally:
+                    self.socketObject.settimeout(None)
+                candidate = self._newSession(sock, addr)
+                candidate.host, candidate.compression = self.host, self.compression
+                try:
+                    if candidate._serverHandshake(RESUME_HANDSHAKE_TIMEOUT) and candidate.peerHello.get("resume") == self.sessionId:
+                        link = candidate
+                        continue
+                except (OSError, RemoteToolkitError) as e:
+                    logging.warning(f"Unexpected Connection While Resuming: {e}")
+                sock.close()
+        if link is None:
+            return None, 0
+        peerReceived = int(link.peerHello.get("received", -1))
+        if not self._canReplay(peerReceived):
+            link.sendString(_hello_message(self.host, refused="frames dropped from the resume buffer"), FRAME_HELLO)
+            link.clientObject.close()
+            return None, 0
+        link.sendString(_hello_message(self.host, resumed=self._received), FRAME_HELLO)
+        return link, peerReceived
+
+    def _adopt(self, link, peerReceived: int):
+        """Go on with the session on the connection of `link`, sending again what the peer did not receive."""
+        if not self._canReplay(peerReceived):
+            link.clientObject.close()
+            raise RemoteToolkitError("Frames the remote computer did not receive were dropped from the resume buffer.")
+        self._scheduler.acquire(CHANNEL_CONTROL)
+        try:
+            self._connectionSocket().close()
+            self.clientObject = link.clientObject
+            if self.connectMode == "initiativeConnect":
+                self.socketObject = link.socketObject
+            self.reader = link.reader
+            if self.codec:
+                self._useCodec(self.codec)
+            with self._keptLock:
+                frames = [frame for number, frame in self._kept if number > peerReceived]
+            for frame in frames:
+                self.clientObject.sendall(frame)
+            self._generation += 1
+            self.lastReceived = time.monotonic()
+        finally:
+            self._scheduler.release()
+        logging.info(f"Session {self.sessionId} Resumed, {len(frames)} Frames Sent Again.")
+
+    def _takeWindow(self, channel: int, size: int):
+        """Wait until the receiver consumed enough of a flow controlled channel, then use `size` bytes of it."""
+        if channel not in self.windows:
+            return
+        with self._recvCond:
+            # A frame may start whenever there is window left, so it may use more than what is left.
+            while self.windows[channel] <= 0:
+                self._receive()
+            self.windows[channel] -= size
+
+    def recvString(self) -> str:
+        return bytes(self.recvFrame()[2]).decode()
+
+    def getCompressionStats(self) -> dict:
+        """Compression statistics of the frames sent, with the achieved ratio and the CPU cost."""
+        stats = dict(self.compressionStats)
+        stats["codec"] = self.codec
+        stats["ratio"] = stats["bytesOut"] / stats["bytesIn"] if stats["bytesIn"] else 1.0
+        stats["decompressTime"] = self.reader.decompressTime if self.reader else 0.0
+        return stats
+
+    def getLatencyStats(self) -> dict:
+        """
+        Round trip times measured by the heartbeat (seconds): smoothed, last, min, max
+        and jitter, with the seconds since the last frame arrived.
+        """
+        stats = dict(self.latencyStats)
+        stats["idle"] = time.monotonic() - self.lastReceived
+        return stats
+
+    def getQueueDepths(self) -> dict:
+        """What waits in the queues of the connection, read by the metrics."""
+        if self.connectMode == "serve":
+            return {"sessions": len(getattr(self, "sessions", ()))}  # Sessions running
+        return {
+            "send": sum(self._scheduler._waiting.values()),  # Frames waiting for the socket
+            "received": len(self._pending) + sum(map(len, self._streams.values())),  # Frames received, waiting for their reader
+            "handlers": self._running,  # Handlers dispatched to threads, running or waiting
+            "resume": len(self._kept),  # Frames kept until the peer acknowledges them
+        }
+
+    def ping(self, timeout=5.0) -> float:
+        """
+        Measure one round trip with a FRAME_PING, returns it in seconds. The answer is
+        read by listen, which must run. Raises RemoteToolkitError on time out.
+        """
+        with self._recvCond:
+            samples = self.latencyStats["samples"]
+        self.sendFrame(FRAME_PING, HEARTBEAT.pack(time.monotonic_ns()))
+        with self._recvCond:
+            if not self._recvCond.wait_for(lambda: self.latencyStats["samples"] > samples, timeout):
+                raise RemoteToolkitError(f"No answer to the ping in {timeout} seconds.")
+            return self.latencyStats["rttLast"]
+
+    def _heartbeat(self, stop: threading.Event):
+        """Ping every heartbeatInterval seconds, and close the connection once the peer stays silent."""
+        timeout = self.heartbeatTimeout or HEARTBEAT_TIMEOUT_FACTOR * self.heartbeatInterval
+        # Pings are sent by another thread: a dead peer can block sending, but must not block the check.
+        sender = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="RemotePing")
+        ping = None
+        try:
+            while not stop.wait(self.heartbeatInterval):
+                silent = time.monotonic() - self.lastReceived
+                if silent > timeout and not self._resuming:
+                    logging.warning(f"Remote Computer Silent For {silent:.1f}s, Closing Connection.")
+                    # A resumable session is resumed on a new connection instead.
+                    if not self.sessionId:
+                        self.connect = False
+                    try:
+                        self.clientObject.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+                    if not self.sessionId:
+                        break
+                if ping is None or ping.done():
+                    ping = sender.submit(self.sendFrame, FRAME_PING, HEARTBEAT.pack(time.monotonic_ns()))
+        finally:
+            sender.shutdown(wait=False, cancel_futures=True)
+
+    def _useCodec(self, codec: str):
+        self.codec = codec
+        self.reader.decompress = COMPRESSORS[codec][1]
+        logging.info(f"Frame Compression: {codec} (Level {self.compressionLevel})")
+
+    def _recvHello(self) -> str:
+        length, msgType, _, _ = self.reader.readHeader()  # Nothing else is sent before the handshake
+        if msgType != FRAME_HELLO or length > MAX_HELLO_SIZE:
+            raise RemoteToolkitError("Unsupported Remote Interface (No Handshake Frame Received)")
+        return self.reader.readExactly(length).decode()
 
     def passiveConnect(self, timeout=0):
         self.connectMode = "passiveConnect"
@@ -196,73 +1462,1061 @@ class RemoteConnection:
         self.socketObject.listen(3)
         logging.info("Waiting for Client Connect...")
         self.clientObject, addr = self.socketObject.accept()
+        self.reader = FrameReader(self.clientObject)
         self.clientAddress, self.clientPort = addr
         logging.info(f"Client Connected: {self.clientAddress}:{self.clientPort}")
+        self._serverHandshake(timeout)
+
+    def _serverHandshake(self, timeout=0) -> bool:
+        """Check the IP and the version of the accepted client, returns False on time out."""
         if self.clientAddress != self.remoteIP and self.remoteIP != WRCT_ANY_IP_ADDRESS:
             self.clientObject.close()
             logging.error(f"Connected IP {self.clientAddress} Does Not Match The Specified {self.remoteIP}")
             raise RemoteToolkitError(f"Connected IP {self.clientAddress} Does Not Match The Specified {self.remoteIP}")
 
-        # Check the client
-        self.sendString(f"Answer! Remote Connection Toolkit version {__version__},server ip: {self.host}")
+        # Check the client, offering the compression codecs when enabled
+        offer = {}
+        if self.compression:
+            offer["compress"] = " ".join([self.compression] + [c for c in COMPRESSORS if c != self.compression])
+        self.sendString(_hello_message(self.host, **offer), FRAME_HELLO)
         if timeout:
             self.clientObject.settimeout(timeout)
         try:
-            msg = self.clientObject.recv(1024).decode()
+            msg = self._recvHello()
         except socket.timeout:
             logging.warning("Can't Connect Remote Computer: Time Out.")
-            return
-        ver = re.search(r"\d+\.\d+\.\d+", msg)[0]
-        logging.debug(f"Received Version: {ver}")
-        if msg and "Answer! Remote Connection Toolkit version" in msg and _check_version(ver):
-            logging.info(f"Client Answered: {msg}")
-        else:
-            logging.error(f"Unsupported Client Interface (Client Answer: {msg})")
-            raise RemoteToolkitError(f"Unsupported Client Interface (Client Answer: {msg})")
+            return False
+        except RemoteToolkitError as e:
+            logging.error(str(e))
+            raise
+        self.clientObject.settimeout(None)
+        _check_client_answer(msg)
+        self.peerHello = _hello_fields(msg)
+        self.sessionId = self.peerHello.get("session")
+        if self.compression and self.peerHello.get("compress") in COMPRESSORS:
+            self._useCodec(self.peerHello["compress"])
+        return True
+
+    def serve(self, funcList: dict, maxSessions=8, timeout=10):
+        """
+        Server mode: keep accepting clients, check each of them like passiveConnect
+        and run listen(funcList) for every session on a pool of maxSessions threads.
+        Clients beyond maxSessions wait in the backlog until a session ends.
+        This function blocks until stopServe() is called.
+        """
+        self.connectMode = "serve"
+        self.sessions = set()
+        self._sessionsLock = threading.Lock()
+        self._dataChannels = {}
+        self._resumeLinks = {}
+        slots = threading.BoundedSemaphore(maxSessions)
+        self.socketObject.bind((self.host, self.port))
+        self.socketObject.listen(max(3, maxSessions))
+        logging.info(f"Serving Up To {maxSessions} Clients...")
+        with concurrent.futures.ThreadPoolExecutor(maxSessions, thread_name_prefix="RemoteSession") as pool:
+            while self.connect:
+                slots.acquire()
+                try:
+                    sock, addr = self.socketObject.accept()
+                except OSError:
+                    slots.release()
+                    break
+                session = self._newSession(sock, addr)
+                session.server = self
+                session.compression = self.compression
+                session.compressionLevel = self.compressionLevel
+                session.heartbeatInterval = self.heartbeatInterval
+                session.heartbeatTimeout = self.heartbeatTimeout
+                session.reconnectTimeout = self.reconnectTimeout
+                session.resumeBufferSize = self.resumeBufferSize
+                pool.submit(self._runSession, session, funcList, timeout, slots)
+        logging.info("Server Stopped.")
+
+    def _newSession(self, sock: socket.socket, addr: tuple):
+        session = type(self).__new__(type(self))
+        session._initState(self.remoteIP, self.port, sock)
+        session.connectMode = "passiveConnect"
+        session.clientObject = sock
+        session.reader = FrameReader(sock)
+        session.clientAddress, session.clientPort = addr[:2]
+        return session
+
+    def _runSession(self, session, funcList: dict, timeout, slots: threading.BoundedSemaphore):
+        with self._sessionsLock:
+            self.sessions.add(session)
+        attached = False
+        try:
+            logging.info(f"Client Connected: {session.clientAddress}:{session.clientPort}")
+            if session._serverHandshake(timeout):
+                if "attach" in session.peerHello:
+                    # A data connection of a transfer running in another session.
+                    self._dataChannelQueue(session.peerHello["attach"]).put(session)
+                    attached = True
+                elif "resume" in session.peerHello:
+                    attached = self._resumeSession(session)
+                else:
+                    session.listen(funcList)
+        except Exception as e:
+            logging.error(f"Session {session.clientAddress}:{session.clientPort} Crashed: {e}")
+        finally:
+            with self._sessionsLock:
+                self.sessions.discard(session)
+            if not attached:
+                session.connect = False
+                session.clientObject.close()
+                logging.info(f"Session {session.clientAddress}:{session.clientPort} Ended.")
+            slots.release()
+
+    def _resumeSession(self, link) -> bool:
+        """Hand a connection resuming a session to that session, returns False if there is none."""
+        with self._sessionsLock:
+            lost = [s for s in self.sessions if s.sessionId == link.peerHello["resume"] and s is not link]
+        if not lost:
+            link.sendString(_hello_message(self.host, refused="unknown session"), FRAME_HELLO)
+            return False
+        self._resumeQueue(lost[0].sessionId).put(link)
+        # The client only comes back when its connection is lost, even if this side did not notice yet.
+        try:
+            lost[0].clientObject.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        return True
+
+    def _resumeQueue(self, sessionId: str) -> queue.Queue:
+        with self._sessionsLock:
+            return self._resumeLinks.setdefault(sessionId, queue.Queue())
+
+    def _dataChannelQueue(self, token: str) -> queue.Queue:
+        with self._sessionsLock:
+            return self._dataChannels.setdefault(token, queue.Queue())
+
+    def _openDataChannels(self, token: str, count: int, timeout=10) -> list:
+        """
+        Open `count` extra connections to the remote computer for a bulk transfer.
+        They go through the same handshake, with `token` naming the transfer.
+        """
+        channels = []
+        try:
+            for _ in range(count):
+                if self.connectMode == "initiativeConnect":
+                    channel = type(self).__new__(type(self))
+                    channel._initState(self.remoteIP, self.port)
+                    channel.socketObject.settimeout(timeout)
+                    channel.socketObject.connect((self.remoteIP, self.port))
+                    channel.connectMode = "initiativeConnect"
+                    channel.clientObject = channel.socketObject
+                    channel.reader = FrameReader(channel.clientObject)
+                    channels.append(channel)
+                    if not channel._clientHandshake(timeout, attach=token):
+                        raise RemoteToolkitError("Data connection handshake timed out.")
+                elif self.server is not None:
+                    # The serving loop accepts the connections of its sessions.
+                    try:
+                        channels.append(self.server._dataChannelQueue(token).get(timeout=timeout))
+                    except queue.Empty:
+                        raise RemoteToolkitError("Data connection did not arrive in time.")
+                else:
+                    self.socketObject.settimeout(timeout)
+                    try:
+                        sock, addr = self.socketObject.accept()
+                    finally:
+                        self.socketObject.settimeout(None)
+                    channel = self._newSession(sock, addr)
+                    channels.append(channel)
+                    if not channel._serverHandshake(timeout) or channel.peerHello.get("attach") != token:
+                        raise RemoteToolkitError("Unexpected connection instead of a data connection.")
+        except BaseException:
+            for channel in channels:
+                channel.clientObject.close()
+            raise
+        finally:
+            if self.server is not None and self.connectMode != "initiativeConnect":
+                with self.server._sessionsLock:
+                    self.server._dataChannels.pop(token, None)
+        return channels
+
+    def stopServe(self):
+        """Stop the server mode and end all of its sessions."""
+        self.connect = False
+        with self._sessionsLock:
+            sockets = [self.socketObject] + [session.clientObject for session in self.sessions]
+            for session in self.sessions:
+                session.connect = False
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.socketObject.close()
 
     def initiativeConnect(self, timeout=0):
         self.connectMode = "initiativeConnect"
         logging.info("Connecting Client...")
         self.socketObject.connect((self.remoteIP, self.port))
         self.clientObject = self.socketObject
+        self.reader = FrameReader(self.clientObject)
         self.clientAddress = self.remoteIP
         self.clientPort = self.port
         logging.info("Client Connected: {}".format(self.clientAddress))
+        if self.autoReconnect:
+            self.sessionId = secrets.token_hex(8)
+            return self._clientHandshake(timeout, session=self.sessionId)
+        return self._clientHandshake(timeout)
 
-        # Check the client
+    def _clientHandshake(self, timeout=0, **fields) -> bool:
+        """Answer the handshake of the server, returns False on time out."""
         if timeout:
             self.clientObject.settimeout(timeout)
         try:
-            msg = self.clientObject.recv(1024)
+            msg = self._recvHello()
         except socket.timeout:
             logging.warning("Can't Connect Remote Computer: Time Out.")
-        msg = msg.decode()
+            return False
+        self.clientObject.settimeout(None)
+        logging.info(f"Server Answered: {msg}")
+
+        # Pick the preferred compression codec if the server offers it.
+        offer = _hello_fields(msg).get("compress", "").split()
+        if self.compression and self.compression in offer:
+            fields["compress"] = self.compression
+        self.sendString(_hello_message(self.host, **fields), FRAME_HELLO)
+        if "compress" in fields:
+            self._useCodec(self.compression)
+        return True
+
+    def callFuture(self, name: str, *args) -> concurrent.futures.Future:
+        """
+        Call the handler `name` of the remote computer without waiting: returns a Future
+        of its return value. Many calls can be in flight, their results are routed by ID.
+        """
+        if not self.listening:
+            raise RemoteToolkitError("Remote calls need listen() running on the connection.")
+        future = concurrent.futures.Future()
+        with self._callsLock:
+            callId = next(self._callIds) & 0xFFFFFFFF
+            self._calls[callId] = future
+        try:
+            self.sendFrame(FRAME_CALL, _call_payload(callId, name, args))
+        except BaseException:
+            with self._callsLock:
+                self._calls.pop(callId, None)
+            raise
+        return future
+
+    def call(self, name: str, *args, timeout=None):
+        """Call the handler `name` of the remote computer and return its return value."""
+        return self.callFuture(name, *args).result(timeout)
+
+    def _runEvent(self, funcList: dict, funcRE: str, event_args: list, callId=None, stream=None):
+        """
+        Run a handler, answering its result if it was called with call(). The handler of an
+        event of a stream runs in that stream, and aborts it with a FRAME_ABORT if it fails.
+        """
+        with _handler_stream(self, stream):
+            if funcRE not in funcList:
+                if callId is not None:
+                    self.send(_result_payload(callId, error=RemoteToolkitError(f"Unknown event {funcRE}")), FRAME_RESULT)
+                elif stream is not None:
+                    self.sendString(f"Unknown event {funcRE}", FRAME_ABORT)
+                return
+            logging.info(f"Event {funcRE} Started, Given Args: {event_args}")
+            measure, failed = metrics_registry.eventStarted(funcRE), False
+            try:
+                func = funcList[funcRE]
+                if getattr(func, "handlerMode", HANDLER_INLINE) == HANDLER_PROCESS:
+                    # Only the arguments and the return value go to the process, not the connection.
+                    funcReturn = _process_pool().submit(func, None, event_args).result()
+                else:
+                    funcReturn = func(self, event_args)
+                logging.log(
+                    logging.INFO if funcReturn in (0, None) or callId is not None else logging.WARNING,
+                    f"Event {funcRE} Ended, Return Value: {funcReturn!r:.200}",
+                )
+                if callId is not None:
+                    self.send(_result_payload(callId, funcReturn), FRAME_RESULT)
+            except Exception as e:
+                failed = True
+                logging.error(f"Event {funcRE} Crashed: {e}")
+                try:
+                    if callId is not None:
+                        self.send(_result_payload(callId, error=e), FRAME_RESULT)
+                    elif stream is not None:
+                        self.sendString(str(e), FRAME_ABORT)
+                    else:
+                        self.sendString(f"showError|{base64.b64encode(str(e).encode('utf-8')).decode('utf-8')},")
+                except OSError:
+                    # The handler crashed because the connection is lost.
+                    self.connect = False
+            finally:
+                metrics_registry.eventEnded(funcRE, measure, failed)
+
+    def _failCalls(self, error: Exception):
+        with self._callsLock:
+            calls, self._calls = self._calls, {}
+        for future in calls.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def _dispatch(self, funcList: dict, funcRE: str, event_args: list, callId=None, stream=None):
+        """Run a handler the way eventHandler() annotated it: inline, or on a thread (lane) of the connection."""
+        func = funcList.get(funcRE)
+        mode = getattr(func, "handlerMode", HANDLER_INLINE)
+        ordered = getattr(func, "handlerOrdered", None)
+        if mode == HANDLER_INLINE and not ordered:
+            self._runEvent(funcList, funcRE, event_args, callId, stream)
+            return
+        # listen never waits here: it is the only reader of call results, which the
+        # running handlers may be waiting for. The slot is taken when the handler starts.
+        with self._recvCond:
+            self._running += 1
+        if ordered:
+            # Handlers of the same lane run one at a time, in the order their events arrived.
+            if ordered not in self._lanes:
+                self._lanes[ordered] = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="RemoteLane")
+            executor = self._lanes[ordered]
+        else:
+            executor = self._handlerPool
+        executor.submit(self._runHandler, funcList, funcRE, event_args, callId, stream)
 
-        self.sendString(
-            "Answer! Remote Connection Toolkit version {},server ip: {}".format(
-                __version__, self.host
-            )
-        )
+    def _runHandler(self, funcList: dict, funcRE: str, event_args: list, callId, stream):
+        # Bounded: at most handlerThreads handlers of the pool and of the lanes run at the same time.
+        self._handlerSlots.acquire()
+        try:
+            self._runEvent(funcList, funcRE, event_args, callId, stream)
+        finally:
+            self._handlerSlots.release()
+            with self._recvCond:
+                self._running -= 1
+                self._recvCond.notify_all()
 
     def listen(self, funcList: dict):
+        """
+        Read events and calls, and run their handlers of funcList. Handlers run in this
+        thread unless eventHandler() annotated them to run in threads or processes.
+        """
         logging.info("Start ranging events...")
-        while self.connect:
-            # Call event message must like this: "EventKeyWord|arg1,arg2,..."
-            msg = self.clientObject.recv(4096).decode()
-            cvk = msg.split("|")
-            funcRE = cvk[0]
-            if funcRE in funcList:
-                event_args = cvk[1].split(",")
-                logging.info(f"Event {funcRE} Started, Given Args: {event_args}")
+        with self._recvCond:
+            self.listening = True
+            self._recvCond.notify_all()  # For the threads waiting until listen runs
+        self._running = 0
+        self._handlerSlots = threading.BoundedSemaphore(self.handlerThreads)
+        self._handlerPool = concurrent.futures.ThreadPoolExecutor(self.handlerThreads, thread_name_prefix="RemoteHandler")
+        self._lanes = {}
+        stopHeartbeat = threading.Event()
+        if self.heartbeatInterval:
+            self.lastReceived = time.monotonic()
+            threading.Thread(target=self._heartbeat, args=(stopHeartbeat,), name="RemoteHeartbeat", daemon=True).start()
+        try:
+            while self.connect:
+                # Call event message must like this: "EventKeyWord|arg1,arg2,..."
                 try:
-                    funcReturn = funcList[funcRE](self, event_args)
-                    logging.log(
-                        logging.INFO if funcReturn in (0, None) else logging.WARNING,
-                        f"Event {funcRE} Ended, Return Value: {funcReturn}",
-                    )
-                except Exception as e:
-                    logging.error(f"Event {funcRE} Crashed: {e}")
+                    # Other frames are kept for their readers, even the ones which do not wait yet.
+                    msgType, _, payload, stream = self._recvMatching(lambda _, msgType: msgType in LISTEN_FRAMES)
+                except (EOFError, OSError) as e:
+                    if self.connect:
+                        logging.warning(f"Connection Lost: {e}")
+                        self.connect = False
+                    break
+                if msgType == FRAME_EVENT:
+                    self._dispatch(funcList, *_split_event(payload), stream=stream)
+                elif msgType == FRAME_CALL:
+                    (callId,) = RPC_CALL.unpack_from(payload)
+                    self._dispatch(funcList, *_split_event(payload[RPC_CALL.size:]), callId)
+                else:
+                    with self._callsLock:
+                        future = self._calls.pop(RPC_RESULT.unpack_from(payload)[0], None)
+                    _set_result(future, payload)
+        finally:
+            self.listening = False
+            stopHeartbeat.set()
+            self._failCalls(RemoteToolkitError("Connection closed before the remote call ended."))
+            # Handlers still running end with the connection.
+            for executor in [self._handlerPool, *self._lanes.values()]:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+
+class RemoteConnectionPool:
+    """
+    Warm connections to many remote computers, keyed by (host, port), for controllers
+    running one command after another. A connection is handed to one caller at a time:
+    checkout() it, then checkin() it to use it again later instead of connecting again.
+    Idle connections are pinged every healthCheckInterval seconds, and closed when they
+    do not answer, stay idle longer than maxIdle, or beyond the maxSize most recent ones.
+    """
+
+    def __init__(self, funcList: dict = None, maxSize=64, maxIdle=300.0, healthCheckInterval=30.0, timeout=10):
+        self.funcList = funcList  # Handlers of the connections, default: builtin_funcs
+        self.maxSize = maxSize
+        self.maxIdle = maxIdle
+        self.healthCheckInterval = healthCheckInterval
+        self.timeout = timeout  # Seconds to connect, and to answer a health check ping
+        # Settings of the new connections, see RemoteConnection.
+        self.compression = None
+        self.heartbeatInterval = 0
+        self.autoReconnect = False
+        self._idle = {}  # (host, port) -> [(connection, last used)], most recent last
+        self._busy = set()
+        self._checking = 0  # Idle connections being health checked
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._checker = None
+        self.stats = {"created": 0, "reused": 0, "evicted": 0}
+
+    def checkout(self, host: str, port=4469) -> RemoteConnection:
+        """Hand out a handshaked connection to (host, port) with listen running, connecting if none is idle."""
+        key = (host, port)
+        with self._lock:
+            if self._closed.is_set():
+                raise RemoteToolkitError("The connection pool is closed.")
+            while self._idle.get(key):
+                remote, _ = self._idle[key].pop()
+                if remote.connect and remote.listening:
+                    self._busy.add(remote)
+                    self.stats["reused"] += 1
+                    return remote
+                self.stats["evicted"] += 1
+        remote = self._connect(host, port)
+        with self._lock:
+            self._busy.add(remote)
+            self.stats["created"] += 1
+            if self._checker is None:
+                self._checker = threading.Thread(target=self._checkIdle, name="RemotePoolCheck", daemon=True)
+                self._checker.start()
+        return remote
+
+    def checkin(self, remote: RemoteConnection):
+        """Give back a connection of checkout(). Lost connections are dropped."""
+        with self._lock:
+            self._busy.discard(remote)
+            if remote.connect and remote.listening and not self._closed.is_set():
+                key = (remote.remoteIP, remote.port)
+                self._idle.setdefault(key, []).append((remote, time.monotonic()))
+                remote = None
+                evicted = self._evict()
+        if remote is not None:
+            evicted = [remote]
+        self._close(evicted)
+
+    @contextlib.contextmanager
+    def connection(self, host: str, port=4469):
+        """checkout() a connection for a with block, and checkin() it afterwards."""
+        remote = self.checkout(host, port)
+        try:
+            yield remote
+        finally:
+            self.checkin(remote)
+
+    def close(self):
+        """Close the idle connections. The connections checked out are closed when they come back."""
+        with self._lock:
+            self._closed.set()
+            idle = [remote for connections in self._idle.values() for remote, _ in connections]
+            self._idle.clear()
+        self._close(idle)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._busy) + self._checking + sum(map(len, self._idle.values()))
+
+    def _connect(self, host: str, port: int) -> RemoteConnection:
+        remote = RemoteConnection(host, port)
+        remote.compression = self.compression
+        remote.heartbeatInterval = self.heartbeatInterval
+        remote.autoReconnect = self.autoReconnect
+        remote.socketObject.settimeout(self.timeout)
+        try:
+            if not remote.initiativeConnect(self.timeout):
+                raise RemoteToolkitError(f"Handshake with {host}:{port} timed out.")
+        except BaseException:
+            remote.socketObject.close()
+            raise
+        threading.Thread(
+            target=remote.listen, args=(self.funcList or builtin_funcs,), name=f"RemotePool {host}:{port}", daemon=True
+        ).start()
+        with remote._recvCond:
+            listening = remote._recvCond.wait_for(lambda: remote.listening or not remote.connect, self.timeout)
+        if not (listening and remote.listening):
+            self._close([remote])
+            raise RemoteToolkitError(f"Connection to {host}:{port} lost before listening.")
+        return remote
+
+    def _evict(self, maxIdle=None) -> list:
+        """
+        Holding the lock: take out the idle connections unused for more than maxIdle
+        seconds, and the least recently used ones beyond maxSize.
+        """
+        now = time.monotonic()
+        entries = [(lastUsed, key, remote) for key, connections in self._idle.items() for remote, lastUsed in connections]
+        entries.sort(key=lambda entry: entry[0], reverse=True)
+        self._idle, kept, evicted = {}, 0, []
+        for lastUsed, key, remote in entries:
+            if kept >= self.maxSize or (maxIdle is not None and now - lastUsed > maxIdle):
+                evicted.append(remote)
+            else:
+                self._idle.setdefault(key, []).insert(0, (remote, lastUsed))
+                kept += 1
+        self.stats["evicted"] += len(evicted)
+        return evicted
+
+    def _close(self, connections: list):
+        for remote in connections:
+            try:
+                closeRemote(remote, [])
+            except OSError:
+                pass
+
+    def _checkIdle(self):
+        """Every healthCheckInterval seconds: close the idle connections which expired or do not answer a ping."""
+        while not self._closed.wait(self.healthCheckInterval):
+            with self._lock:
+                evicted = self._evict(self.maxIdle)
+                # Taken out while they are pinged, so that they can not be checked out meanwhile.
+                checked, self._idle = self._idle, {}
+                self._checking = sum(map(len, checked.values()))
+            healthy, failed = {}, 0
+            for key, connections in checked.items():
+                for remote, lastUsed in connections:
+                    try:
+                        if not (remote.connect and remote.listening):
+                            raise RemoteToolkitError("Connection lost.")
+                        remote.ping(self.timeout)
+                        healthy.setdefault(key, []).append((remote, lastUsed))
+                    except (OSError, RemoteToolkitError) as e:
+                        logging.warning(f"Pooled Connection {key[0]}:{key[1]} Failed Its Health Check: {e}")
+                        evicted.append(remote)
+                        failed += 1
+            with self._lock:
+                self.stats["evicted"] += failed
+                for key, connections in healthy.items():
+                    if self._closed.is_set():
+                        evicted += [remote for remote, _ in connections]
+                    else:
+                        # Connections checked in meanwhile were used more recently.
+                        self._idle[key] = connections + self._idle.get(key, [])
+                self._checking = 0
+            self._close(evicted)
+
+
+class FanOutResult:
+    """The answer of one remote computer to fanOut: the return value, or the error which stopped it."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.ok = False
+        self.value = None
+        self.error = None
+        self.timedOut = False
+        self.connectTime = 0.0  # Seconds to check out a connection
+        self.elapsed = 0.0  # Seconds from the start of this host to its answer
+
+
+def _split_host(host, port: int) -> tuple:
+    """(host, port) of "host", "host:port" or a (host, port) tuple."""
+    if isinstance(host, (tuple, list)):
+        return host[0], int(host[1])
+    name, sep, hostPort = host.rpartition(":")
+    if sep and hostPort.isdigit() and ":" not in name:
+        return name, int(hostPort)
+    return host, port
+
+
+def _checkout_into(future: concurrent.futures.Future, pool: RemoteConnectionPool, host: str, port: int):
+    try:
+        future.set_result(pool.checkout(host, port))
+    except BaseException as e:
+        future.set_exception(e)
+
+
+def _fan_out_one(pool: RemoteConnectionPool, host: str, port: int, name: str, args: tuple, timeout: float) -> FanOutResult:
+    """Check out a connection to one host and call `name` on it, both within `timeout` seconds."""
+    result = FanOutResult(host, port)
+    start = time.perf_counter()
+    remote = None
+    try:
+        # Resolving, connecting and the handshake can hang: they run aside, under the deadline of the call.
+        checkout = concurrent.futures.Future()
+        threading.Thread(
+            target=_checkout_into, args=(checkout, pool, host, port), name=f"RemoteFanOut {host}:{port}", daemon=True
+        ).start()
+        try:
+            remote = checkout.result(timeout)
+        except concurrent.futures.TimeoutError:
+
+            def checkinLate(done: concurrent.futures.Future):
+                if done.exception() is None:
+                    pool.checkin(done.result())
+
+            checkout.add_done_callback(checkinLate)
+            raise TimeoutError(f"No connection in {timeout} seconds.")
+        result.connectTime = time.perf_counter() - start
+        future = remote.callFuture(name, *args)
+        try:
+            result.value = future.result(max(start + timeout - time.perf_counter(), 0))
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            # The handler may still be running: the connection is not reused.
+            closeRemote(remote, [])
+            raise TimeoutError(f"No answer in {timeout} seconds.")
+        result.ok = True
+    except Exception as e:
+        # Whatever went wrong with one host, the others still get their results.
+        result.error = e
+        result.timedOut = isinstance(e, TimeoutError)
+    finally:
+        if remote is not None:
+            pool.checkin(remote)
+        result.elapsed = time.perf_counter() - start
+    return result
+
+
+def fanOut(hosts, name: str, *args, port=4469, concurrency=FANOUT_CONCURRENCY, timeout=30.0, pool: RemoteConnectionPool = None):
+    """
+    Call the handler `name` on many remote computers, `concurrency` at a time, each one
+    within `timeout` seconds. Yields a FanOutResult per host as soon as it answers, so
+    slow hosts do not hold back the others. Connections are checked out of `pool`; without
+    one, a pool is made for this fan-out and closed at the end.
+    """
+    ownPool = pool is None
+    if ownPool:
+        pool = RemoteConnectionPool(maxSize=concurrency, timeout=timeout)
+    executor = concurrent.futures.ThreadPoolExecutor(concurrency, thread_name_prefix="RemoteFanOut")
+    try:
+        futures = [executor.submit(_fan_out_one, pool, *_split_host(host, port), name, args, timeout) for host in hosts]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+    finally:
+        # Stopping the iteration early cancels the hosts which did not start.
+        executor.shutdown(wait=False, cancel_futures=True)
+        if ownPool:
+            pool.close()
+
+
+def fanOutSummary(results: list, wallTime: float = None) -> dict:
+    """Aggregate timing of the FanOutResults of a fan-out, with the stragglers slowest first."""
+    times = sorted(result.elapsed for result in results)
+
+    def percentile(fraction: float) -> float:
+        return times[max(math.ceil(fraction * len(times)) - 1, 0)] if times else 0.0
+
+    median = percentile(0.5)
+    stragglers = sorted(
+        (result for result in results if result.elapsed > FANOUT_STRAGGLER_FACTOR * median),
+        key=lambda result: result.elapsed,
+        reverse=True,
+    )
+    return {
+        "hosts": len(results),
+        "ok": sum(result.ok for result in results),
+        "failed": sum(not result.ok for result in results),
+        "timedOut": sum(result.timedOut for result in results),
+        "wallTime": wallTime,
+        "min": times[0] if times else 0.0,
+        "median": median,
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": percentile(1.0),
+        "stragglers": [{"host": result.host, "port": result.port, "elapsed": result.elapsed} for result in stragglers],
+    }
+
+
+def _fan_out_main(argv: list) -> int:
+    """
+    Command line of fanOut: prints a JSON line per host as soon as it answers, then
+    the summary. Returns 1 when a host failed.
+    """
+    parser = argparse.ArgumentParser(
+        prog="RemoteConnectionToolkit.py fanout", description="Call a handler on many remote computers at once."
+    )
+    parser.add_argument("name", help="handler to call, like listPath or catchScreenshot")
+    parser.add_argument("args", nargs="*", help="arguments of the handler")
+    parser.add_argument("-H", "--hosts", action="append", default=[], help="host or host:port, comma separated")
+    parser.add_argument("-f", "--hosts-file", help="file with a host per line, - for the standard input")
+    parser.add_argument("-p", "--port", type=int, default=4469, help="port of the hosts without one")
+    parser.add_argument("-c", "--concurrency", type=int, default=FANOUT_CONCURRENCY, help="hosts called at once")
+    parser.add_argument("-t", "--timeout", type=float, default=30.0, help="seconds for each host")
+    parser.add_argument("-o", "--output", help="folder where bytes results (screenshots) are written as host_port.bin")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log the connections")
+    options = parser.parse_args(argv)
+    hosts = [host for spec in options.hosts for host in spec.split(",") if host]
+    if options.hosts_file:
+        lines = sys.stdin if options.hosts_file == "-" else open(options.hosts_file, encoding="utf-8")
+        hosts += [line.strip() for line in lines if line.strip() and not line.startswith("#")]
+    if not hosts:
+        parser.error("no hosts given, use --hosts or --hosts-file")
+    _setup_logging()
+    logging.getLogger().setLevel(logging.INFO if options.verbose else logging.WARNING)
+    results, start = [], time.perf_counter()
+    for result in fanOut(
+        hosts, options.name, *options.args, port=options.port, concurrency=options.concurrency, timeout=options.timeout
+    ):
+        results.append(result)
+        line = {"host": result.host, "port": result.port, "ok": result.ok, "elapsed": round(result.elapsed, 3)}
+        if not result.ok:
+            line["error"] = str(result.error)
+        elif isinstance(result.value, bytes):
+            line["bytes"] = len(result.value)
+            if options.output:
+                line["file"] = os.path.join(options.output, f"{result.host}_{result.port}.bin")
+                with open(line["file"], "wb") as file:
+                    file.write(result.value)
+        else:
+            line["result"] = result.value
+        print(json.dumps(line, default=str), flush=True)
+    print(json.dumps({"summary": fanOutSummary(results, time.perf_counter() - start)}), flush=True)
+    return 0 if all(result.ok for result in results) else 1
+
+
+class AsyncRemoteConnection:
+    """
+    RemoteConnection on asyncio streams. It speaks the same protocol and handshake,
+    but every connection lives on one event loop instead of owning a thread.
+    Handlers in funcList may be plain functions or "async def" coroutines.
+    """
+
+    def __init__(self, remoteIP: str, port=4469):
+        _setup_logging()
+        self.connect = True
+        self.connectMode = "unconnect"
+        self.remoteIP = remoteIP
+        self.host = socket.gethostname()
+        self.port = port
+        self.reader = None
+        self.clientObject = None  # asyncio.StreamWriter
+        self._loop = None  # Event loop of the connection, set when connecting
+        self.fileChunkSize = FILE_CHUNK_SIZE
+        self.state = {}  # Free for handlers to keep per-connection data
+        self.listening = False
+        self._calls = {}  # Call ID -> asyncio.Future of the calls waiting for their result
+        self._callIds = itertools.count(1)
+        self._recvCond = asyncio.Condition()
+        self._reading = False
+        self._pending = collections.deque()  # Complete frames received for another reader
+        self._streams = {}  # Stream ID -> complete frames received for the request or handler of that stream
+        self._streamUsers = {}  # Stream ID -> requests and handlers using it
+        self._streamIds = itertools.count()
+        self._fragments = {}  # Channel -> first fragments of a frame
+        self._consumed = dict.fromkeys(FLOW_CONTROLLED, 0)
+        self.heartbeatInterval = 0  # Seconds between two pings while listening, 0: no heartbeat
+        self.heartbeatTimeout = None  # Seconds without any frame before closing, default: 3 intervals
+        self.latencyStats = _latency_stats()
+        self.lastReceived = time.monotonic()  # When the last frame arrived
+        metrics_registry.track(self)
+
+    def getLocalAddress(self) -> str:
+        return self.host
+
+    def getLatencyStats(self) -> dict:
+        stats = dict(self.latencyStats)
+        stats["idle"] = time.monotonic() - self.lastReceived
+        return stats
+
+    def getQueueDepths(self) -> dict:
+        """What waits in the queues of the connection, read by the metrics."""
+        return {
+            "sendBytes": self.clientObject.transport.get_write_buffer_size() if self.clientObject else 0,
+            "received": len(self._pending) + sum(map(len, self._streams.values())),
+        }
+
+    async def _heartbeat(self):
+        """Ping every heartbeatInterval seconds, and close the connection once the peer stays silent."""
+        timeout = self.heartbeatTimeout or HEARTBEAT_TIMEOUT_FACTOR * self.heartbeatInterval
+        while True:
+            await asyncio.sleep(self.heartbeatInterval)
+            silent = time.monotonic() - self.lastReceived
+            if silent > timeout:
+                logging.warning(f"Remote Computer Silent For {silent:.1f}s, Closing Connection.")
+                self.connect = False
+                self.clientObject.close()
+                return
+            self.sendFrame(FRAME_PING, HEARTBEAT.pack(time.monotonic_ns()))
+
+    def sendFrame(self, msgType: int, payload=b"", flags=0, channel=None) -> int:
+        """Queue one frame for sending, on a logical channel like RemoteConnection.sendFrame. Await drain() to wait until it is flushed."""
+        # Frames are neither fragmented nor held back by the receiver's windows.
+        channel = _frame_channel(msgType) if channel is None else channel
+        stream = None if msgType in STREAMLESS_FRAMES else _stream_of(self)
+        header = _pack_header(len(payload), msgType, flags | channel << CHANNEL_SHIFT, stream)
+        if _running_loop() is self._loop:
+            self.clientObject.writelines((header, payload))
+        else:
+            # From a HANDLER_THREAD handler: the transport may only be written from its loop.
+            self._loop.call_soon_threadsafe(self.clientObject.writelines, (header, bytes(payload)))
+        self.trafficStats["bytesOut"] += len(header) + len(payload)
+        _add_event_traffic(1, len(header) + len(payload))
+        return len(payload)
+
+    def send(self, msg, msgType=FRAME_DATA, channel=None) -> int:
+        return self.sendFrame(msgType, msg, channel=channel)
+
+    def sendString(self, msg: str, msgType=FRAME_EVENT) -> int:
+        return self.send(msg.encode(), msgType)
+
+    async def drain(self):
+        await self.clientObject.drain()
+
+    async def sendFrameFromFile(self, file, offset: int, count: int, msgType=FRAME_DATA, flags=0) -> int:
+        """Send one frame whose payload is `count` bytes of a regular file, with loop.sendfile."""
+        header = _pack_header(count, msgType, flags | _frame_channel(msgType) << CHANNEL_SHIFT, _stream_of(self))
+        self.clientObject.write(header)
+        await self.drain()
+        loop = asyncio.get_running_loop()
+        sent = await loop.sendfile(self.clientObject.transport, file, offset, count)
+        if sent != count:
+            raise RemoteToolkitError(f"File {file.name} was truncated while sending it.")
+        self.trafficStats["bytesOut"] += len(header) + count
+        _add_event_traffic(1, len(header) + count)
+        return count
+
+    async def recvFrame(self, channel=None) -> tuple:
+        """
+        Receive the next frame of a logical channel, or of any channel, returns (msgType, flags, payload).
+        Streams and listen work like in RemoteConnection.recvFrame.
+        """
+        stream = _stream_of(self)
+
+        def wanted(frameChannel: int, msgType: int) -> bool:
+            if stream is not None:
+                return channel is None or frameChannel == channel or msgType == FRAME_ABORT
+            return (channel is None or frameChannel == channel) and not (self.listening and msgType in LISTEN_FRAMES)
+
+        msgType, flags, payload, _ = await self._recvMatching(wanted, stream)
+        if msgType == FRAME_ABORT:
+            raise RemoteToolkitError(f"The remote handler failed: {bytes(payload).decode(errors='replace')}")
+        return msgType, flags, payload
+
+    async def _recvMatching(self, wanted, stream=None) -> tuple:
+        """Receive the next frame of a stream for which wanted(channel, msgType) is true, see RemoteConnection._recvMatching."""
+        async with self._recvCond:
+            frames = self._pending if stream is None else self._streams[stream]
+            while True:
+                for index, frame in enumerate(frames):
+                    if wanted(frame[0], frame[1]):
+                        del frames[index]
+                        break
+                else:
+                    await self._receive()
+                    continue
+                break
+        frameChannel, msgType, flags, payload, frameStream = frame
+        credit = _window_credit(self._consumed, frameChannel, len(payload))
+        _add_event_traffic(0, FRAME_HEADER.size + len(payload))
+        if credit:
+            self.sendFrame(FRAME_WINDOW, CHANNEL_WINDOW.pack(frameChannel, credit))
+        return msgType, flags, payload, frameStream
+
+    async def _receive(self):
+        """
+        Holding _recvCond: read the next frame, or wait while another task does. The lock is
+        released while reading, so that the other tasks can take the frames routed to them.
+        """
+        if self._reading:
+            await self._recvCond.wait()
+            return
+        self._reading = True
+        self._recvCond.release()
+        try:
+            length, msgType, flags = FRAME_HEADER.unpack(await self.reader.readexactly(FRAME_HEADER.size))
+            stream = STREAM_ID.unpack(await self.reader.readexactly(STREAM_ID.size))[0] if flags & FLAG_STREAM else None
+            payload = await self.reader.readexactly(length)
+        finally:
+            await self._recvCond.acquire()
+            self._reading = False
+            self._recvCond.notify_all()
+        self.lastReceived = time.monotonic()
+        self.trafficStats["bytesIn"] += FRAME_HEADER.size + length + (stream is not None and STREAM_ID.size)
+        if msgType == FRAME_PING:
+            self.sendFrame(FRAME_PONG, payload)
+        elif msgType == FRAME_PONG:
+            _add_rtt(self.latencyStats, payload)
+        elif msgType != FRAME_WINDOW:  # This side does not hold frames back
+            frame = _assemble_frame(self._fragments, msgType, flags, payload)
+            if frame is not None:
+                self._route(frame + (stream,))
+
+    def _openStream(self, stream=None) -> int:
+        """See RemoteConnection._openStream."""
+        if stream is None:
+            stream = (2 * next(self._streamIds) + (self.connectMode == "initiativeConnect")) & 0xFFFFFFFF
+        self._streamUsers[stream] = self._streamUsers.get(stream, 0) + 1
+        self._streams.setdefault(stream, collections.deque())
+        return stream
+
+    def _closeStream(self, stream: int):
+        """See RemoteConnection._closeStream."""
+        self._streamUsers[stream] -= 1
+        if self._streamUsers[stream]:
+            return
+        del self._streamUsers[stream]
+        for answer in _drop_frames(self._consumed, self._streams.pop(stream)):
+            self.sendFrame(*answer)
+
+    def _route(self, frame: tuple):
+        """See RemoteConnection._route."""
+        stream = frame[4]
+        if stream is None or frame[1] == FRAME_EVENT:
+            if stream is not None and self.listening:
+                self._openStream(stream)
+            self._pending.append(frame)
+        elif stream in self._streams:
+            self._streams[stream].append(frame)
+        else:
+            for answer in _drop_frames(self._consumed, [frame]):
+                self.sendFrame(*answer)
+
+    async def recvString(self) -> str:
+        return (await self.recvFrame())[2].decode()
+
+    async def _recvHello(self) -> str:
+        length, msgType, _ = FRAME_HEADER.unpack(await self.reader.readexactly(FRAME_HEADER.size))
+        if msgType != FRAME_HELLO or length > MAX_HELLO_SIZE:
+            raise RemoteToolkitError("Unsupported Remote Interface (No Handshake Frame Received)")
+        return (await self.reader.readexactly(length)).decode()
+
+    async def passiveConnect(self, timeout=0):
+        self.connectMode = "passiveConnect"
+        accepted = asyncio.get_running_loop().create_future()
+
+        async def onClient(reader, writer):
+            if accepted.done():
+                writer.close()
+            else:
+                accepted.set_result((reader, writer))
+
+        server = await asyncio.start_server(onClient, self.host, self.port, backlog=3)
+        logging.info("Waiting for Client Connect...")
+        try:
+            self.reader, self.clientObject = await accepted
+            self._loop = asyncio.get_running_loop()
+        finally:
+            server.close()
+        self.clientAddress, self.clientPort = self.clientObject.get_extra_info("peername")[:2]
+        logging.info(f"Client Connected: {self.clientAddress}:{self.clientPort}")
+        if self.clientAddress != self.remoteIP and self.remoteIP != WRCT_ANY_IP_ADDRESS:
+            self.clientObject.close()
+            logging.error(f"Connected IP {self.clientAddress} Does Not Match The Specified {self.remoteIP}")
+            raise RemoteToolkitError(f"Connected IP {self.clientAddress} Does Not Match The Specified {self.remoteIP}")
+
+        # Check the client
+        self.sendString(_hello_message(self.host), FRAME_HELLO)
+        try:
+            msg = await asyncio.wait_for(self._recvHello(), timeout or None)
+        except asyncio.TimeoutError:
+            logging.warning("Can't Connect Remote Computer: Time Out.")
+            return
+        _check_client_answer(msg)
+
+    async def initiativeConnect(self, timeout=0):
+        self.connectMode = "initiativeConnect"
+        logging.info("Connecting Client...")
+        self.reader, self.clientObject = await asyncio.open_connection(self.remoteIP, self.port)
+        self._loop = asyncio.get_running_loop()
+        self.clientAddress = self.remoteIP
+        self.clientPort = self.port
+        logging.info("Client Connected: {}".format(self.clientAddress))
+
+        # Check the client
+        try:
+            msg = await asyncio.wait_for(self._recvHello(), timeout or None)
+        except asyncio.TimeoutError:
+            logging.warning("Can't Connect Remote Computer: Time Out.")
+            return
+        logging.info(f"Server Answered: {msg}")
+        self.sendString(_hello_message(self.host), FRAME_HELLO)
+        await self.drain()
+
+    def callFuture(self, name: str, *args) -> asyncio.Future:
+        """Call the handler `name` of the remote computer without waiting, see RemoteConnection.callFuture."""
+        if not self.listening:
+            raise RemoteToolkitError("Remote calls need listen() running on the connection.")
+        future = asyncio.get_running_loop().create_future()
+        callId = next(self._callIds) & 0xFFFFFFFF
+        self._calls[callId] = future
+        self.sendFrame(FRAME_CALL, _call_payload(callId, name, args))
+        return future
+
+    async def call(self, name: str, *args, timeout=None):
+        """Call the handler `name` of the remote computer and return its return value."""
+        future = self.callFuture(name, *args)
+        await self.drain()
+        return await asyncio.wait_for(future, timeout)
+
+    async def _runEvent(self, funcList: dict, funcRE: str, event_args: list, callId=None, stream=None):
+        with _handler_stream(self, stream):
+            if funcRE not in funcList:
+                if callId is not None:
+                    self.send(_result_payload(callId, error=RemoteToolkitError(f"Unknown event {funcRE}")), FRAME_RESULT)
+                elif stream is not None:
+                    self.sendString(f"Unknown event {funcRE}", FRAME_ABORT)
+                return
+            logging.info(f"Event {funcRE} Started, Given Args: {event_args}")
+            measure, failed = metrics_registry.eventStarted(funcRE), False
+            try:
+                func = funcList[funcRE]
+                mode = getattr(func, "handlerMode", HANDLER_INLINE)
+                if mode == HANDLER_PROCESS:
+                    funcReturn = await asyncio.get_running_loop().run_in_executor(_process_pool(), func, None, event_args)
+                elif mode == HANDLER_THREAD and not inspect.iscoroutinefunction(func):
+                    # A blocking handler must not hold up the event loop, and every connection on it.
+                    run = contextvars.copy_context().run
+                    funcReturn = await asyncio.get_running_loop().run_in_executor(None, run, func, self, event_args)
+                else:
+                    funcReturn = func(self, event_args)
+                if inspect.isawaitable(funcReturn):
+                    funcReturn = await funcReturn
+                logging.log(
+                    logging.INFO if funcReturn in (0, None) or callId is not None else logging.WARNING,
+                    f"Event {funcRE} Ended, Return Value: {funcReturn!r:.200}",
+                )
+                if callId is not None:
+                    self.send(_result_payload(callId, funcReturn), FRAME_RESULT)
+            except Exception as e:
+                failed = True
+                logging.error(f"Event {funcRE} Crashed: {e}")
+                if callId is not None:
+                    self.send(_result_payload(callId, error=e), FRAME_RESULT)
+                elif stream is not None:
+                    self.sendString(str(e), FRAME_ABORT)
+                else:
                     self.sendString(f"showError|{base64.b64encode(str(e).encode('utf-8')).decode('utf-8')},")
+            finally:
+                metrics_registry.eventEnded(funcRE, measure, failed)
+
+    async def listen(self, funcList: dict):
+        logging.info("Start ranging events...")
+        self.listening = True
+        heartbeat = None
+        if self.heartbeatInterval:
+            self.lastReceived = time.monotonic()
+            heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            while self.connect:
+                try:
+                    # Other frames are left to the tasks of their requests.
+                    msgType, _, payload, stream = await self._recvMatching(lambda _, msgType: msgType in LISTEN_FRAMES)
+                except (EOFError, OSError) as e:
+                    if self.connect:
+                        logging.warning(f"Connection Lost: {e}")
+                        self.connect = False
+                    break
+                if msgType == FRAME_EVENT:
+                    await self._runEvent(funcList, *_split_event(payload), stream=stream)
+                elif msgType == FRAME_CALL:
+                    (callId,) = RPC_CALL.unpack_from(payload)
+                    await self._runEvent(funcList, *_split_event(payload[RPC_CALL.size:]), callId)
+                else:
+                    _set_result(self._calls.pop(RPC_RESULT.unpack_from(payload)[0], None), payload)
+                    continue
+                if self.connect:
+                    await self.drain()
+        finally:
+            self.listening = False
+            if heartbeat is not None:
+                heartbeat.cancel()
+            calls, self._calls = self._calls, {}
+            for future in calls.values():
+                if not future.done():
+                    future.set_exception(RemoteToolkitError("Connection closed before the remote call ended."))
 
 
 # Here is the implementation of the built-in instruction set:
@@ -297,131 +2551,1422 @@ def showError(remote: RemoteConnection, args: list):
 def closeRemote(remote: RemoteConnection, args: list):
     """Close Connection of The Remote"""
     # No arg used
-    remote.sendString("Close|1,")
+    try:
+        remote.sendString("Close|1,")
+    except OSError:
+        pass  # The remote computer already closed its side
+    remote.connect = False  # Before closing: a resumable session must not be resumed
     remote.clientObject.close()
     logging.info("Connection Closed.")
-    remote.connect = False
     remote.connectMode = "unconnect"
+    metrics_registry.retire(remote)
+
+
+def eventHandler(mode=HANDLER_INLINE, ordered=None):
+    """
+    Annotate a handler with how listen runs it: HANDLER_INLINE, HANDLER_THREAD or HANDLER_PROCESS.
+    Handlers with the same `ordered` name run one at a time, in the order their events
+    arrived, so their frames and replies never interleave. Process handlers are called
+    as func(None, args) in another process: they must be module level functions.
+    """
+
+    def annotate(func):
+        func.handlerMode = mode
+        func.handlerOrdered = ordered
+        return func
+
+    return annotate
+
+
+_processPool = None
+_processPoolLock = threading.Lock()
+_encodeInline = False  # Set once the worker processes failed to start: images are encoded in this process
+
+
+def _process_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """The worker processes shared by the screenshot encoder and the process handlers, started on first use."""
+    global _processPool
+    with _processPoolLock:
+        if _processPool is None:
+            # "spawn": forking a process which runs threads (listeners, capture) is unsafe.
+            _processPool = concurrent.futures.ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+    return _processPool
+
 
+def _int_arg(args: list, index: int, default=0) -> int:
+    return int(args[index]) if len(args) > index and args[index] != "" else default
 
+
+def _scan_path(root: str, depth: int):
+    """(name relative to root, os.DirEntry) of a folder and of its subfolders up to `depth` levels."""
+    # One open scandir iterator per level: the memory does not grow with the folder sizes.
+    stack = [("", os.scandir(root), 0)]
+    try:
+        while stack:
+            prefix, iterator, level = stack[-1]
+            entry = next(iterator, None)
+            if entry is None:
+                iterator.close()
+                stack.pop()
+                continue
+            name = prefix + entry.name
+            yield name, entry
+            if level < depth and entry.is_dir(follow_symlinks=False):
+                try:
+                    stack.append((name + "/", os.scandir(entry.path), level + 1))
+                except OSError:
+                    pass
+    finally:
+        for _, iterator, _ in stack:
+            iterator.close()
+
+
+def _entry_info(name: str, entry: os.DirEntry) -> dict:
+    try:
+        entryStat = entry.stat(follow_symlinks=False)
+        size, mtime = entryStat.st_size, entryStat.st_mtime
+    except OSError:
+        size = mtime = None
+    if entry.is_symlink():
+        kind = "link"
+    elif entry.is_dir(follow_symlinks=False):
+        kind = "dir"
+    elif entry.is_file(follow_symlinks=False):
+        kind = "file"
+    else:
+        kind = "other"
+    return {"name": name, "type": kind, "size": size, "mtime": mtime}
+
+
+class PathListCache:
+    """
+    LRU cache of the listings received by getPathList. A cached listing is
+    revalidated with the mtime of the remote folder: if it did not change, the
+    remote computer only answers "not modified".
+    Changing a file in place does not change the mtime of its folder, so the
+    sizes and mtimes of cached entries can be outdated; only names are exact.
+    """
+
+    def __init__(self, maxSize=128, maxListingSize=10000):
+        self.maxSize = maxSize
+        self.maxListingSize = maxListingSize  # Bigger listings are not cached
+        self.hits = 0
+        self.misses = 0
+        self._listings = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        """(folder mtime, pages, cursor) of a cached listing, or None."""
+        with self._lock:
+            listing = self._listings.get(key)
+            if listing is not None:
+                self._listings.move_to_end(key)
+            return listing
+
+    def put(self, key: tuple, mtime: int, pages: list, cursor):
+        with self._lock:
+            self._listings[key] = (mtime, pages, cursor)
+            self._listings.move_to_end(key)
+            while len(self._listings) > self.maxSize:
+                self._listings.popitem(last=False)
+
+    def discard(self, key: tuple):
+        with self._lock:
+            self._listings.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
+
+
+# Listings cached by getPathList, shared by all connections.
+path_list_cache = PathListCache()
+
+
+def _recv_listing(remote: RemoteConnection, onPage) -> dict:
+    """Pass the pages of a sendPathList answer to onPage(), returns the closing {"cursor", "mtime", ...}."""
+    while True:
+        msgType, _, payload = remote.recvFrame(CHANNEL_BULK)
+        if msgType == FRAME_DATA:
+            onPage(json.loads(payload))
+        elif msgType == FRAME_END:
+            return json.loads(payload)
+        elif msgType == FRAME_EVENT and bytes(payload).startswith(b"showError|"):
+            raise RemoteToolkitError(base64.b64decode(_split_event(payload)[1][0]).decode("utf-8"))
+        else:
+            raise RemoteToolkitError(f"Unexpected frame (type {msgType}) in a path listing.")
+
+
+@eventHandler(HANDLER_THREAD, ordered="send")
 def sendPathList(remote: RemoteConnection, args: list):
     """Passive transfer function, generally do not call directly."""
     # args[0] : Folder Path(str)
-    _tmp = json.dumps(list(os.listdir(os.path.abspath(args[0]))))
-    remote.sendString(_tmp)
+    # args[1] : Cursor(int), number of entries to skip, default: 0
+    # args[2] : Limit(int), maximum number of entries to send, default: 0 (all)
+    # args[3] : Depth(int), levels of subfolders to list too, default: 0
+    # args[4] : Cached Folder mtime(int, ns), answer "not modified" if it did not change
+    # Every page is a FRAME_DATA frame with a JSON list of {"name", "type", "size", "mtime"},
+    # the FRAME_END frame holds the cursor to continue from ({"cursor": null} at the end)
+    # and the mtime of the folder.
+    cursor, limit, depth = _int_arg(args, 1), _int_arg(args, 2), _int_arg(args, 3)
+    path = os.path.abspath(args[0])
+    mtime = os.stat(path).st_mtime_ns
+    if time.time_ns() - mtime < 2_000_000_000:
+        # The folder could change again within the mtime resolution: do not let it be cached.
+        mtime = None
+    elif depth == 0 and mtime == _int_arg(args, 4, None):
+        remote.sendFrame(FRAME_END, json.dumps({"notModified": True, "mtime": mtime}).encode())
+        return
+    entries = _scan_path(path, depth)
+    entries = itertools.islice(entries, cursor, cursor + limit + 1 if limit else None)
+    page, count, more = [], 0, False
+    for name, entry in entries:
+        if limit and count == limit:
+            more = True
+            break
+        page.append(_entry_info(name, entry))
+        count += 1
+        if len(page) == LISTING_PAGE_SIZE:
+            remote.send(json.dumps(page).encode())
+            page = []
+    if page:
+        remote.send(json.dumps(page).encode())
+    remote.sendFrame(FRAME_END, json.dumps({"cursor": cursor + count if more else None, "mtime": mtime}).encode())
+
+
+@eventHandler(HANDLER_THREAD)
+def listPath(remote: RemoteConnection, args: list) -> dict:
+    """
+    A page of the contents of a folder, for RemoteConnection.call():
+    returns {"entries": [{"name", "type", "size", "mtime"}, ...], "cursor": next cursor or None}.
+    """
+    # args[0] : Folder Path(str)
+    # args[1] : Cursor(int), number of entries to skip, default: 0
+    # args[2] : Limit(int), maximum number of entries, default: LISTING_PAGE_SIZE
+    # args[3] : Depth(int), levels of subfolders to list too, default: 0
+    cursor, limit, depth = _int_arg(args, 1), _int_arg(args, 2) or LISTING_PAGE_SIZE, _int_arg(args, 3)
+    entries = itertools.islice(_scan_path(os.path.abspath(args[0]), depth), cursor, cursor + limit + 1)
+    page = [_entry_info(name, entry) for name, entry in entries]
+    return {"entries": page[:limit], "cursor": cursor + limit if len(page) > limit else None}
 
 
+@eventHandler(HANDLER_THREAD, ordered="recive")
 def getPathList(remote: RemoteConnection, args: list):
-    """Proactively request the contents of a specified folder from a remote computer."""
+    """
+    Proactively request the contents of a specified folder from a remote computer.
+    Every page of entries is printed, returns the cursor to continue from (None at the end).
+    Listings without depth are kept in path_list_cache and only sent again if the folder changed.
+    """
     # args[0] : Folder Path(str)
-    remote.sendString(f"sendPathList|{args[0]},")
-    _tmp = remote.clientObject.recv(2048)
-    print(_tmp.decode())
+    # args[1] : Cursor(int), number of entries to skip, default: 0
+    # args[2] : Limit(int), maximum number of entries to get, default: 0 (all)
+    # args[3] : Depth(int), levels of subfolders to list too, default: 0
+    cursor, limit, depth = _int_arg(args, 1), _int_arg(args, 2), _int_arg(args, 3)
+    key = (remote.clientAddress, remote.port, args[0], cursor, limit)
+    cached = path_list_cache.get(key) if depth == 0 else None
+    pages, size = [], 0
+
+    def onPage(page: list):
+        nonlocal pages, size
+        print(json.dumps(page))
+        if pages is not None:
+            size += len(page)
+            pages = pages + [page] if size <= path_list_cache.maxListingSize else None
+
+    with _request_stream(remote):
+        remote.sendString(f"sendPathList|{args[0]},{cursor},{limit},{depth},{cached[0] if cached else ''},")
+        end = _recv_listing(remote, onPage)
+    if end.get("notModified") and cached:
+        path_list_cache.hits += 1
+        for page in cached[1]:
+            print(json.dumps(page))
+        return cached[2]
+    path_list_cache.misses += 1
+    if depth == 0 and end["mtime"] is not None and pages is not None:
+        path_list_cache.put(key, end["mtime"], pages, end["cursor"])
+    else:
+        path_list_cache.discard(key)
+    return end["cursor"]
 
 
-def sendFile(remote: RemoteConnection, args: list):
-    """Proactively sending file to remote computer."""
-    # args[0] : File Path(str)
-    remote.sendString(f"receiveFile|{args[0]},")
-    msg = remote.clientObject.recv(1024).decode()
-    if msg == "Ready":
-        with open(os.path.abspath(args[0]), "rb") as file:
-            while (f_data := file.read(1024)):
-                remote.send(f_data)
-    else:
+class _FileReceiver:
+    """
+    Receiving side of a resumable file transfer. The content is written to
+    "<file>.part", and "<file>.part.json" records which version of the source
+    file it is and how many bytes matched the checksums of the sender.
+    """
+
+    def __init__(self, filename: str, source):
+        self.filename = filename
+        self.partName = filename + ".part"
+        self.journalName = filename + ".part.json"
+        self.source = source  # [size, mtime_ns] of the sent file, None if it can not be resumed
+        self.verified = self._resumeOffset()
+        self.file = open(self.partName, "r+b" if self.verified else "wb")
+        self.file.truncate(self.verified)
+        self.file.seek(self.verified)
+        self._crc = 0
+        self._received = 0
+
+    def _resumeOffset(self) -> int:
+        if not self.source:
+            return 0
+        try:
+            with open(self.journalName, encoding="utf-8") as journal:
+                record = json.load(journal)
+            if record["source"] == self.source:
+                return min(record["verified"], os.path.getsize(self.partName))
+        except (OSError, ValueError, KeyError):
+            pass
+        return 0
+
+    def write(self, data):
+        self.file.write(data)
+        self._crc = zlib.crc32(data, self._crc)
+        self._received += len(data)
+
+    def checkChunk(self, payload):
+        index, offset, crc = CHUNK_CHECKSUM.unpack(payload)
+        if offset != self.verified or crc != self._crc:
+            self.file.truncate(self.verified)
+            raise RemoteToolkitError(
+                f"Chunk {index} of {self.filename} is corrupted, send it again to resume from byte {self.verified}."
+            )
+        self.verified += self._received
+        self._crc = self._received = 0
+        self.file.flush()
+        if self.source:
+            with open(self.journalName + ".tmp", "w", encoding="utf-8") as journal:
+                json.dump({"source": self.source, "verified": self.verified}, journal)
+            os.replace(self.journalName + ".tmp", self.journalName)
+
+    def close(self):
+        self.file.close()
+
+    def finish(self):
+        self.close()
+        if self._received:
+            raise RemoteToolkitError(f"The last chunk of {self.filename} has no checksum.")
+        os.replace(self.partName, self.filename)
+        if os.path.exists(self.journalName):
+            os.remove(self.journalName)
+
+
+def _transfer_source(args: list):
+    """[size, mtime_ns] of the sent file from the reciveFile args, None if it can not be resumed."""
+    try:
+        size, mtime = int(args[1]), int(args[2])
+    except (IndexError, ValueError):
+        return None
+    return [size, mtime] if size >= 0 else None
+
+
+def _file_offer(path: str) -> str:
+    """The reciveFile event offering a file, with the size and mtime used to resume it."""
+    fileStat = os.stat(os.path.abspath(path))
+    size = fileStat.st_size if stat.S_ISREG(fileStat.st_mode) else -1
+    return f"reciveFile|{path},{size},{fileStat.st_mtime_ns},"
+
+
+def _ready_offset(msgType: int, msg) -> int:
+    """Offset to resume from in the "Ready|offset" answer of reciveFile."""
+    reply, _, offset = bytes(msg).decode().partition("|")
+    if msgType != FRAME_REPLY or reply != "Ready":
         raise RemoteToolkitError(
             "The remote computer's response is incorrect when transferring files."
         )
+    offset = int(offset or 0)
+    if offset:
+        logging.info(f"Resuming File Transfer From Byte {offset}")
+    return offset
+
+
+def _send_file_content(remote: RemoteConnection, file, offset=0):
+    """
+    Send the content of an open file from `offset` in chunks of remote.fileChunkSize
+    bytes. Every chunk is a FRAME_DATA frame followed by its FRAME_CHECKSUM frame.
+    """
+    chunkSize = remote.fileChunkSize
+    regular = stat.S_ISREG(os.fstat(file.fileno()).st_mode)
+    buffer = bytearray(chunkSize)
+    view = memoryview(buffer)
+    if regular:
+        file.seek(offset)
+    index, pos = 0, offset
+    while (n := file.readinto(buffer)):
+        # The chunk is read once, for its checksum, and that buffer is sent:
+        # sending it again from the file would read it twice.
+        remote.send(view[:n])
+        remote.sendFrame(FRAME_CHECKSUM, CHUNK_CHECKSUM.pack(index, pos, zlib.crc32(view[:n])))
+        index, pos = index + 1, pos + n
+
+
+def _read_at(file, view: memoryview, offset: int) -> int:
+    """Read into view at offset without moving a shared file position (os.preadv where available)."""
+    if hasattr(os, "preadv"):
+        return os.preadv(file.fileno(), [view], offset)
+    file.seek(offset)
+    return file.readinto(view)
+
+
+def _write_at(file, view: memoryview, offset: int):
+    """Write view at offset without moving a shared file position (os.pwrite where available)."""
+    if hasattr(os, "pwrite"):
+        while view:
+            n = os.pwrite(file.fileno(), view, offset)
+            view, offset = view[n:], offset + n
+    else:
+        file.seek(offset)
+        file.write(view)
+
+
+def _send_stripes(channel: RemoteConnection, path: str, size: int, blocks, progress: list, slot: int):
+    """Send the chunks taken from the shared `blocks` counter over one data connection."""
+    chunkSize = channel.fileChunkSize
+    view = memoryview(bytearray(chunkSize))
+    with open(path, "rb") as file:
+        while (offset := next(blocks) * chunkSize) < size:
+            n = _read_at(file, view[: min(chunkSize, size - offset)], offset)
+            channel.sendFrame(FRAME_CHECKSUM, CHUNK_CHECKSUM.pack(offset // chunkSize, offset, zlib.crc32(view[:n])))
+            channel.send(view[:n])
+            progress[slot] += n
+    channel.sendFrame(FRAME_END)
+
+
+def _recive_stripes(channel: RemoteConnection, partName: str, chunkSize: int) -> int:
+    """Write the chunks arriving on one data connection in place, returns the bytes received."""
+    total = 0
+    crc = None  # Of the next chunk, every FRAME_DATA follows its FRAME_CHECKSUM
+    with open(partName, "r+b") as file:
+        while True:
+            msgType, _, payload = channel.recvFrame(CHANNEL_BULK)
+            if msgType == FRAME_CHECKSUM:
+                index, offset, crc = CHUNK_CHECKSUM.unpack(payload)
+            elif msgType == FRAME_DATA and len(payload) <= chunkSize:
+                if crc is None:
+                    raise RemoteToolkitError(f"Stripe data of {partName} arrived before its checksum.")
+                if zlib.crc32(payload) != crc:
+                    raise RemoteToolkitError(f"Chunk {index} of {partName} is corrupted.")
+                _write_at(file, memoryview(payload), offset)
+                total += len(payload)
+                crc = None
+            elif msgType == FRAME_END:
+                channel.clientObject.close()  # Ends the sender's drain
+                return total
+            else:
+                raise RemoteToolkitError(f"Unexpected frame (type {msgType}) while receiving file.")
 
 
+def _drain_data_channel(channel: RemoteConnection, timeout=10):
+    """
+    Wait until the receiver closed a data connection. Closing a socket with unread
+    window updates would reset the connection and drop what the receiver did not read yet.
+    """
+    channel.clientObject.settimeout(timeout)
+    channel.clientObject.shutdown(socket.SHUT_WR)
+    try:
+        while True:
+            channel.recvFrame()
+    except EOFError:
+        pass
+
+
+def _send_file_striped(remote: RemoteConnection, path: str, streams: int):
+    """
+    Send a regular file striped over `streams` extra data connections. With
+    streams=0, connections are added one by one while they raise the throughput.
+    """
+    size = os.path.getsize(path)
+    token = secrets.token_hex(8)
+    remote.sendString(f"reciveFileStriped|{path},{size},{remote.fileChunkSize},{token},")
+    msgType, _, msg = remote.recvFrame(CHANNEL_CONTROL)
+    _ready_offset(msgType, msg)
+    blocks = itertools.count()
+    progress, channels, futures = [], [], []
+
+    def addChannels(count: int):
+        remote.sendFrame(FRAME_STRIPE, str(count).encode())
+        for channel in remote._openDataChannels(token, count):
+            channel.fileChunkSize = remote.fileChunkSize
+            channels.append(channel)
+            progress.append(0)
+            futures.append(pool.submit(_send_stripes, channel, path, size, blocks, progress, len(progress) - 1))
+
+    def measure() -> float:
+        sent = sum(progress)
+        time.sleep(STRIPE_PROBE_TIME)
+        return (sum(progress) - sent) / STRIPE_PROBE_TIME
+
+    with concurrent.futures.ThreadPoolExecutor(MAX_STRIPES, thread_name_prefix="RemoteStripe") as pool:
+        try:
+            addChannels(streams or 1)
+            if not streams:
+                rate = measure()
+                while len(channels) < MAX_STRIPES and not all(future.done() for future in futures):
+                    addChannels(1)
+                    newRate = measure()
+                    if newRate < rate * 1.1:
+                        break
+                    rate = newRate
+            logging.info(f"Striped Transfer of {path} Uses {len(channels)} Connections")
+            for future in futures:
+                future.result()
+            for channel in channels:
+                _drain_data_channel(channel)
+        finally:
+            for channel in channels:
+                channel.clientObject.close()
+    remote.sendFrame(FRAME_END)
+
+
+@eventHandler(HANDLER_THREAD, ordered="send")
+def sendFile(remote: RemoteConnection, args: list):
+    """Proactively sending file to remote computer, resuming an interrupted transfer."""
+    # args[0] : File Path(str)
+    # args[1] : Number of Connections(int), "auto" to choose it from the throughput, default: 1
+    streams = args[1] if len(args) > 1 else ""
+    with _request_stream(remote):
+        if streams not in ("", "1") and stat.S_ISREG(os.stat(os.path.abspath(args[0])).st_mode):
+            _send_file_striped(remote, args[0], 0 if streams == "auto" else min(int(streams), MAX_STRIPES))
+            return
+        remote.sendString(_file_offer(args[0]))
+        msgType, _, msg = remote.recvFrame(CHANNEL_CONTROL)
+        offset = _ready_offset(msgType, msg)
+        with open(os.path.abspath(args[0]), "rb") as file:
+            _send_file_content(remote, file, offset)
+        remote.sendFrame(FRAME_END)
+
+
+@eventHandler(HANDLER_THREAD, ordered="recive")
 def reciveFile(remote: RemoteConnection, args: list):
     """Passive file-receiving function, generally do not call directly."""
     # args[0] : File Path(str)
-    remote.sendString("Ready")
-    filename = args[0]
-    with open(filename, "wb") as file:
+    # args[1] : File Size(int), -1 if unknown
+    # args[2] : Modification Time of The File(int, ns)
+    receiver = _FileReceiver(args[0], _transfer_source(args))
+    remote.sendString(f"Ready|{receiver.verified}", FRAME_REPLY)
+    try:
         while True:
-            f_data = remote.clientObject.recv(1024)
-            if f_data:
-                file.write(f_data)
+            msgType, _, f_data = remote.recvFrame(CHANNEL_BULK)
+            if msgType == FRAME_DATA:
+                receiver.write(f_data)
+            elif msgType == FRAME_CHECKSUM:
+                receiver.checkChunk(f_data)
+            elif msgType == FRAME_END:
+                break
             else:
+                raise RemoteToolkitError(f"Unexpected frame (type {msgType}) while receiving file.")
+    finally:
+        receiver.close()
+    receiver.finish()
+
+
+@eventHandler(HANDLER_THREAD, ordered="recive")
+def reciveFileStriped(remote: RemoteConnection, args: list):
+    """Passive receiving side of a striped file transfer, generally do not call directly."""
+    # args[0] : File Path(str)
+    # args[1] : File Size(int)
+    # args[2] : Chunk Size(int)
+    # args[3] : Transfer Token(str)
+    filename, size, chunkSize, token = args[0], int(args[1]), int(args[2]), args[3]
+    if not 0 < chunkSize <= 16 * FILE_CHUNK_SIZE:
+        raise RemoteToolkitError(f"Unsupported chunk size {chunkSize} for a striped transfer.")
+    partName = filename + ".part"
+    with open(partName, "wb") as file:
+        file.truncate(size)
+    remote.sendString("Ready", FRAME_REPLY)
+    channels, futures = [], []
+    with concurrent.futures.ThreadPoolExecutor(MAX_STRIPES, thread_name_prefix="RemoteStripe") as pool:
+        try:
+            while True:
+                msgType, _, payload = remote.recvFrame(CHANNEL_BULK)
+                if msgType == FRAME_STRIPE:
+                    for channel in remote._openDataChannels(token, int(payload)):
+                        channels.append(channel)
+                        futures.append(pool.submit(_recive_stripes, channel, partName, chunkSize))
+                elif msgType == FRAME_END:
+                    break
+                else:
+                    raise RemoteToolkitError(f"Unexpected frame (type {msgType}) while receiving file.")
+            received = sum(future.result() for future in futures)
+        finally:
+            for channel in channels:
+                channel.clientObject.close()
+    if received != size:
+        raise RemoteToolkitError(f"Striped transfer of {filename} is incomplete: {received} of {size} bytes.")
+    os.replace(partName, filename)
+
+
+def _block_signatures(filename: str) -> bytes:
+    """Block size and signatures of every whole block of a file, empty if it does not exist."""
+    if not os.path.isfile(filename):
+        return DELTA_HEADER.pack(0)
+    # Like rsync: blocks of about sqrt(size) bytes.
+    blockSize = min(max(math.isqrt(os.path.getsize(filename)), 2048), 1 << 17)
+    signatures = [DELTA_HEADER.pack(blockSize)]
+    with open(filename, "rb") as file:
+        while len(block := file.read(blockSize)) == blockSize:
+            signatures.append(
+                DELTA_SIGNATURE.pack(zlib.adler32(block), hashlib.blake2b(block, digest_size=16).digest())
+            )
+    return b"".join(signatures)
+
+
+def _send_delta(remote: RemoteConnection, file, signatures) -> tuple:
+    """
+    Send the content of a file as literal FRAME_DATA runs and FRAME_COPY block
+    references matching the receiver's signatures. Returns (literal bytes, reused bytes).
+    """
+    blockSize = DELTA_HEADER.unpack_from(signatures)[0]
+    table = {}
+    for index, (weak, strong) in enumerate(DELTA_SIGNATURE.iter_unpack(memoryview(signatures)[DELTA_HEADER.size :])):
+        table.setdefault(weak, {}).setdefault(strong, index)
+    size = os.fstat(file.fileno()).st_size
+    if not table or size < blockSize:
+        _send_literal(remote, file, 0, size)
+        return size, 0
+
+    literal = reused = 0
+    copyStart = copyCount = 0
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+
+        def flushCopy():
+            nonlocal copyCount
+            if copyCount:
+                remote.sendFrame(FRAME_COPY, DELTA_COPY.pack(copyStart, copyCount))
+                copyCount = 0
+
+        pos = literalStart = 0
+        weak = zlib.adler32(data[0:blockSize])
+        a, b = weak & 0xFFFF, weak >> 16
+        while pos + blockSize <= size:
+            strongs = table.get(weak)
+            if strongs:
+                index = strongs.get(hashlib.blake2b(data[pos : pos + blockSize], digest_size=16).digest())
+                if index is not None:
+                    if literalStart < pos:
+                        flushCopy()
+                        _send_literal(remote, data, literalStart, pos)
+                        literal += pos - literalStart
+                    if copyCount and copyStart + copyCount == index:
+                        copyCount += 1
+                    else:
+                        flushCopy()
+                        copyStart, copyCount = index, 1
+                    reused += blockSize
+                    pos = literalStart = pos + blockSize
+                    if pos + blockSize <= size:
+                        weak = zlib.adler32(data[pos : pos + blockSize])
+                        a, b = weak & 0xFFFF, weak >> 16
+                    continue
+            if pos + blockSize < size:
+                # Roll the Adler-32 checksum of the window one byte forward.
+                out, new = data[pos], data[pos + blockSize]
+                a = (a - out + new) % 65521
+                b = (b - blockSize * out + a - 1) % 65521
+                weak = (b << 16) | a
+            pos += 1
+        flushCopy()
+        if literalStart < size:
+            _send_literal(remote, data, literalStart, size)
+            literal += size - literalStart
+    return literal, reused
+
+
+def _send_literal(remote: RemoteConnection, data, start: int, end: int):
+    """Send data[start:end] of a mmap or file as FRAME_DATA frames of remote.fileChunkSize bytes at most."""
+    for pos in range(start, end, remote.fileChunkSize):
+        count = min(remote.fileChunkSize, end - pos)
+        if isinstance(data, mmap.mmap):
+            remote.send(data[pos : pos + count])
+        else:
+            remote.sendFrameFromFile(data, pos, count)
+
+
+@eventHandler(HANDLER_THREAD, ordered="send")
+def sendFileDelta(remote: RemoteConnection, args: list):
+    """Proactively sending file to remote computer, only sending what differs from its copy."""
+    # args[0] : File Path(str)
+    with _request_stream(remote):
+        remote.sendString(f"reciveFileDelta|{args[0]},")
+        msgType, _, signatures = remote.recvFrame(CHANNEL_CONTROL)
+        if msgType != FRAME_REPLY:
+            raise RemoteToolkitError(
+                "The remote computer's response is incorrect when transferring files."
+            )
+        with open(os.path.abspath(args[0]), "rb") as file:
+            literal, reused = _send_delta(remote, file, signatures)
+            file.seek(0)
+            digest = hashlib.blake2b()
+            while (f_data := file.read(remote.fileChunkSize)):
+                digest.update(f_data)
+        remote.sendFrame(FRAME_END, digest.digest())
+    logging.info(f"Delta Transfer of {args[0]}: {literal} Bytes Sent, {reused} Bytes Reused")
+
+
+@eventHandler(HANDLER_THREAD, ordered="recive")
+def reciveFileDelta(remote: RemoteConnection, args: list):
+    """Passive receiving side of a delta transfer, generally do not call directly."""
+    # args[0] : File Path(str)
+    filename = args[0]
+    signatures = _block_signatures(filename)
+    blockSize = DELTA_HEADER.unpack_from(signatures)[0]
+    remote.send(signatures, FRAME_REPLY)
+    digest = hashlib.blake2b()
+
+    def write(data):
+        newFile.write(data)
+        digest.update(data)
+
+    with open(filename + ".delta", "wb") as newFile, open(filename if blockSize else os.devnull, "rb") as basis:
+        while True:
+            msgType, _, payload = remote.recvFrame(CHANNEL_BULK)
+            if msgType == FRAME_DATA:
+                write(payload)
+            elif msgType == FRAME_COPY:
+                index, count = DELTA_COPY.unpack(payload)
+                basis.seek(index * blockSize)
+                for _ in range(count):
+                    write(basis.read(blockSize))
+            elif msgType == FRAME_END:
+                expected = bytes(payload)
                 break
+            else:
+                raise RemoteToolkitError(f"Unexpected frame (type {msgType}) while receiving file.")
+    if digest.digest() != expected:
+        os.remove(filename + ".delta")
+        raise RemoteToolkitError(f"Delta transfer of {filename} does not match the sent file.")
+    os.replace(filename + ".delta", filename)
+
+
+def getFileDelta(remote: RemoteConnection, args: list):
+    """Proactively obtain file from remote computer, only receiving what differs from the local copy."""
+    # args[0] : File Path(str)
+    remote.sendString(f"sendFileDelta|{args[0]},")
 
 
 def getFile(remote: RemoteConnection, args: list):
     """Proactively obtain file from remote computer."""
     # args[0] : File Path(str)
-    remote.sendString(f"sendFile|{args[0]},")
+    # args[1] : Number of Connections(int), "auto" to choose it from the throughput, default: 1
+    remote.sendString(f"sendFile|{args[0]},{args[1] if len(args) > 1 else ''},")
+
+
+class _FrameWriter:
+    """Write-only file object sending everything written as FRAME_DATA frames."""
+
+    def __init__(self, remote: RemoteConnection):
+        self.remote = remote
+
+    def write(self, data) -> int:
+        return self.remote.send(data)
+
+
+class _FrameStream:
+    """Read-only file object over the FRAME_DATA frames of a stream, until its FRAME_END."""
+
+    def __init__(self, remote: RemoteConnection):
+        self.remote = remote
+        self._data = b""
+        self._pos = 0
+        self._ended = False
+
+    def read(self, size=-1) -> bytes:
+        while self._pos == len(self._data) and not self._ended:
+            msgType, _, payload = self.remote.recvFrame(CHANNEL_BULK)
+            if msgType == FRAME_DATA:
+                self._data, self._pos = bytes(payload), 0
+            elif msgType == FRAME_END:
+                self._ended = True
+            else:
+                raise RemoteToolkitError(f"Unexpected frame (type {msgType}) in a stream.")
+        end = len(self._data) if size < 0 else self._pos + size
+        data = self._data[self._pos : end]
+        self._pos += len(data)
+        return data
+
+
+def _split_globs(arg: str) -> list:
+    return [pattern for pattern in arg.split(";") if pattern]
+
+
+def _walk_directory(root: str, include: list, exclude: list):
+    """(path, name in the archive) of every entry of a directory to send, parents first."""
+
+    def excluded(relPath: str) -> bool:
+        return any(fnmatch.fnmatch(relPath, p) or fnmatch.fnmatch(os.path.basename(relPath), p) for p in exclude)
+
+    for dirPath, dirNames, fileNames in os.walk(root):
+        relDir = os.path.relpath(dirPath, root).replace(os.sep, "/")
+        relDir = "" if relDir == "." else relDir + "/"
+        dirNames[:] = [name for name in dirNames if not excluded(relDir + name)]
+        for name in dirNames:
+            yield os.path.join(dirPath, name), relDir + name
+        for name in fileNames:
+            relPath = relDir + name
+            if excluded(relPath):
+                continue
+            if include and not any(fnmatch.fnmatch(relPath, p) or fnmatch.fnmatch(name, p) for p in include):
+                continue
+            yield os.path.join(dirPath, name), relPath
+
+
+@eventHandler(HANDLER_THREAD, ordered="send")
+def sendDirectory(remote: RemoteConnection, args: list):
+    """Proactively sending a directory tree to remote computer as one tar stream."""
+    # args[0] : Folder Path(str)
+    # args[1] : Include Globs(str), separated by ";", default: every file
+    # args[2] : Exclude Globs(str), separated by ";", default: nothing
+    include = _split_globs(args[1]) if len(args) > 1 else []
+    exclude = _split_globs(args[2]) if len(args) > 2 else []
+    with _request_stream(remote):
+        remote.sendString(f"reciveDirectory|{args[0]},")
+        msgType, _, msg = remote.recvFrame(CHANNEL_CONTROL)
+        _ready_offset(msgType, msg)
+        # The archive is generated on the fly, straight into the frames.
+        with tarfile.open(fileobj=_FrameWriter(remote), mode="w|", bufsize=remote.fileChunkSize) as tar:
+            for path, arcName in _walk_directory(os.path.abspath(args[0]), include, exclude):
+                tar.add(path, arcName, recursive=False)
+        remote.sendFrame(FRAME_END)
+
+
+def _safe_members(tar: tarfile.TarFile, root: str):
+    """Members of a tar stream which stay inside root, for Pythons without extraction filters."""
+    root = os.path.realpath(root)
+    for member in tar:
+        target = os.path.realpath(os.path.join(root, member.name))
+        if os.path.commonpath([root, target]) != root or member.isdev() or (
+            (member.issym() or member.islnk()) and os.path.isabs(member.linkname)
+        ):
+            logging.warning(f"Skipped Unsafe Directory Entry: {member.name}")
+            continue
+        yield member
+
+
+@eventHandler(HANDLER_THREAD, ordered="recive")
+def reciveDirectory(remote: RemoteConnection, args: list):
+    """Passive directory-receiving function, generally do not call directly."""
+    # args[0] : Folder Path(str)
+    os.makedirs(args[0], exist_ok=True)
+    remote.sendString("Ready", FRAME_REPLY)
+    stream = _FrameStream(remote)
+    with tarfile.open(fileobj=stream, mode="r|", bufsize=remote.fileChunkSize) as tar:
+        if hasattr(tarfile, "tar_filter"):
+            # Keeps modes and mtimes, refuses paths leaving the directory.
+            tar.extractall(args[0], filter="tar")
+        else:
+            tar.extractall(args[0], members=_safe_members(tar, args[0]))
+    # Read up to the end of the stream (the padding of the archive).
+    while stream.read(remote.fileChunkSize):
+        pass
+
+
+def getDirectory(remote: RemoteConnection, args: list):
+    """Proactively obtain a directory tree from remote computer."""
+    # args[0] : Folder Path(str)
+    # args[1] : Include Globs(str), separated by ";", default: every file
+    # args[2] : Exclude Globs(str), separated by ";", default: nothing
+    remote.sendString(f"sendDirectory|{','.join(args[:3])},")
+
+
+async def getPathListAsync(remote: AsyncRemoteConnection, args: list):
+    """getPathList for AsyncRemoteConnection."""
+    # args : Same as getPathList
+    with _request_stream(remote):
+        remote.sendString(f"sendPathList|{','.join(map(str, args[:4]))},")
+        while True:
+            msgType, _, payload = await remote.recvFrame(CHANNEL_BULK)
+            if msgType == FRAME_DATA:
+                print(payload.decode())
+            elif msgType == FRAME_END:
+                return json.loads(payload)["cursor"]
+            else:
+                raise RemoteToolkitError(f"Unexpected frame (type {msgType}) in a path listing.")
+
+
+async def sendFileAsync(remote: AsyncRemoteConnection, args: list):
+    """sendFile for AsyncRemoteConnection, over the connection itself only."""
+    # args[0] : File Path(str)
+    # args[1] : Number of Connections(int), only 1: striped transfers are not supported
+    if len(args) > 1 and args[1] not in ("", "1"):
+        raise RemoteToolkitError("Striped transfers are not supported by AsyncRemoteConnection.")
+    with _request_stream(remote):
+        remote.sendString(_file_offer(args[0]))
+        msgType, _, msg = await remote.recvFrame(CHANNEL_CONTROL)
+        offset = _ready_offset(msgType, msg)
+        with open(os.path.abspath(args[0]), "rb") as file:
+            if stat.S_ISREG(os.fstat(file.fileno()).st_mode):
+                file.seek(offset)
+            index, pos = 0, offset
+            # Each chunk is read once, for its checksum, and sent from memory.
+            while (f_data := file.read(remote.fileChunkSize)):
+                remote.send(f_data)
+                remote.sendFrame(FRAME_CHECKSUM, CHUNK_CHECKSUM.pack(index, pos, zlib.crc32(f_data)))
+                await remote.drain()
+                index, pos = index + 1, pos + len(f_data)
+        remote.sendFrame(FRAME_END)
+
+
+async def reciveFileAsync(remote: AsyncRemoteConnection, args: list):
+    """reciveFile for AsyncRemoteConnection."""
+    # args[0] : File Path(str)
+    # args[1] : File Size(int), -1 if unknown
+    # args[2] : Modification Time of The File(int, ns)
+    receiver = _FileReceiver(args[0], _transfer_source(args))
+    remote.sendString(f"Ready|{receiver.verified}", FRAME_REPLY)
+    try:
+        while True:
+            msgType, _, f_data = await remote.recvFrame(CHANNEL_BULK)
+            if msgType == FRAME_DATA:
+                receiver.write(f_data)
+            elif msgType == FRAME_CHECKSUM:
+                receiver.checkChunk(f_data)
+            elif msgType == FRAME_END:
+                break
+            else:
+                raise RemoteToolkitError(f"Unexpected frame (type {msgType}) while receiving file.")
+    finally:
+        receiver.close()
+    receiver.finish()
+
+
+class CapturedFrame:
+    """A frame of ScreenCaptureEngine, its pixels are not overwritten until release()."""
+
+    def __init__(self, engine, monitor: int, pixels: numpy.ndarray):
+        self.engine = engine
+        self.monitor = monitor
+        self.pixels = pixels  # RGB, (height, width, 3)
+        self.timestamp = 0.0  # time.perf_counter() when the grab started
+        self._leases = 0
+
+    def release(self):
+        self.engine._release(self)
 
+    def __enter__(self) -> numpy.ndarray:
+        return self.pixels
 
-def catchScreenshot(remote: RemoteConnection, args: list):
-    """Catch The Screenshot of This Computer"""
+    def __exit__(self, *exc):
+        self.release()
+
+
+class ScreenCaptureEngine:
+    """
+    Captures the monitors of this computer on one dedicated thread, which keeps a
+    single mss grabber open and reads the monitor geometry once. Every monitor has
+    two reusable buffers: the latest frame, handed out to any number of consumers,
+    and the one the next capture is written to.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closing = False
+        self._error = None
+        self._monitors = None
+        self._wanted = set()
+        self._errors = {}  # monitor -> exception of its last grab
+        self._latest = {}  # monitor -> CapturedFrame
+        self._spare = {}  # monitor -> CapturedFrame nobody uses
+        self.captures = 0
+
+    def _start(self):
+        if self._thread is None:
+            self._closing = False
+            self._thread = threading.Thread(target=self._run, name="ScreenCaptureEngine", daemon=True)
+            self._thread.start()
+
+    def _wait(self, ready, timeout: float):
+        """Wait (holding the condition) until ready() returns something, raising the errors of the capture thread."""
+        deadline = time.perf_counter() + timeout
+        while (result := ready()) is None:
+            if self._error is not None:
+                error, self._error = self._error, None
+                raise RemoteToolkitError(f"Screen capture failed: {error}") from error
+            if not self._cond.wait(deadline - time.perf_counter()) and time.perf_counter() >= deadline:
+                raise RemoteToolkitError("Screen capture timed out.")
+        return result
+
+    @property
+    def monitors(self) -> list:
+        """Geometry of the monitors ({"left", "top", "width", "height"}), read once."""
+        with self._cond:
+            self._start()
+            return self._wait(lambda: self._monitors, 10)
+
+    def acquire(self, monitor: int, maxAge=0.0, timeout=10.0) -> CapturedFrame:
+        """
+        Latest frame of a monitor grabbed at most maxAge seconds before the call, captured
+        if needed. Consumers asking at the same time share one capture. Release it when done.
+        """
+        since = time.perf_counter() - maxAge
+
+        def ready():
+            if monitor in self._errors:
+                raise RemoteToolkitError(f"Cannot capture monitor {monitor}: {self._errors.pop(monitor)}")
+            frame = self._latest.get(monitor)
+            if frame is not None and frame.timestamp >= since:
+                frame._leases += 1
+                return frame
+            if monitor not in self._wanted:
+                self._wanted.add(monitor)
+                self._cond.notify_all()
+            return None
+
+        with self._cond:
+            self._start()
+            return self._wait(ready, timeout)
+
+    def _release(self, frame: CapturedFrame):
+        with self._cond:
+            frame._leases -= 1
+            if frame._leases == 0 and self._latest.get(frame.monitor) is not frame:
+                self._spare[frame.monitor] = frame
+
+    def close(self):
+        """Stop the capture thread and close the grabber, it is started again when needed."""
+        with self._cond:
+            thread, self._closing = self._thread, True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        try:
+            with mss.mss() as sct:
+                with self._cond:
+                    self._monitors = sct.monitors[1:]
+                    self._cond.notify_all()
+                while True:
+                    with self._cond:
+                        while not self._wanted and not self._closing:
+                            self._cond.wait()
+                        if self._closing:
+                            break
+                        wanted, self._wanted = self._wanted, set()
+                    for monitor in wanted:
+                        self._capture(sct, monitor)
+        except Exception as e:
+            logging.error(f"Screen Capture Failed: {e}")
+            with self._cond:
+                self._error = e
+        finally:
+            with self._cond:
+                self._thread = None
+                self._wanted.clear()
+                self._cond.notify_all()
+
+    def _capture(self, sct, monitor: int):
+        started = time.perf_counter()
+        try:
+            shot = sct.grab(self._monitors[monitor])
+        except Exception as e:
+            with self._cond:
+                self._errors[monitor] = e
+                self._cond.notify_all()
+            return
+        with self._cond:
+            frame = self._spare.pop(monitor, None)
+        if frame is None or frame.pixels.shape != (shot.height, shot.width, 3):
+            frame = CapturedFrame(self, monitor, numpy.empty((shot.height, shot.width, 3), numpy.uint8))
+        bgra = numpy.frombuffer(shot.bgra, numpy.uint8).reshape(shot.height, shot.width, 4)
+        numpy.copyto(frame.pixels, bgra[:, :, 2::-1])
+        frame.timestamp = started
+        with self._cond:
+            previous, self._latest[monitor] = self._latest.get(monitor), frame
+            if previous is not None and previous._leases == 0:
+                self._spare[monitor] = previous
+            self.captures += 1
+            self._cond.notify_all()
+
+
+# Captures the screens for the screenshot handlers of every connection.
+screen_capture_engine = ScreenCaptureEngine()
+
+
+def _screenshot_pixels(pixels: numpy.ndarray, args: list) -> numpy.ndarray:
+    """Crop pixels to the region args[0:4] (x, y, width, height) and scale them by args[4]."""
+    x, y = _int_arg(args, 0), _int_arg(args, 1)
+    width = _int_arg(args, 2) or pixels.shape[1] - x
+    height = _int_arg(args, 3) or pixels.shape[0] - y
+    scale = float(args[4]) if len(args) > 4 and args[4] != "" else 1.0
+    if not (0 <= x < pixels.shape[1] and 0 <= y < pixels.shape[0] and width > 0 and height > 0 and 0 < scale <= 1):
+        raise RemoteToolkitError(f"Invalid screenshot region {x},{y},{width},{height} or scale {scale}.")
+    # Cropping the captured frame is a view: only the region is converted and encoded.
+    pixels = pixels[y:y + height, x:x + width]
+    if scale == 1:
+        return pixels
+    image = PIL.Image.fromarray(pixels)
+    size = (max(round(image.width * scale), 1), max(round(image.height * scale), 1))
+    if int(1 / scale) > 1:
+        # reduce() averages blocks of pixels, much faster than a resampling filter.
+        image = image.reduce(int(1 / scale))
+    if image.size != size:
+        image = image.resize(size, PIL.Image.BILINEAR)
+    return numpy.asarray(image)
+
+
+def _image_codec(spec: str) -> tuple:
+    """(PIL format, quality) of a codec argument: "png", "raw", "jpeg:high", "webp:80"..."""
+    name, _, quality = (spec or "png").lower().partition(":")
+    if name not in IMAGE_CODECS:
+        raise RemoteToolkitError(f"Unknown image codec: {name}")
+    quality = IMAGE_QUALITIES.get(quality or "medium", quality)
+    if not str(quality).isdigit():
+        raise RemoteToolkitError(f"Unknown image quality: {quality}")
+    return IMAGE_CODECS[name], int(quality)
+
+
+def _encode_image(pixels: numpy.ndarray, format: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if format == "PNG":
+        PIL.Image.fromarray(pixels).save(buffer, format, compress_level=1)
+    else:
+        PIL.Image.fromarray(pixels).save(buffer, format, quality=quality)
+    return buffer.getvalue()
+
+
+def _encode(pixels: numpy.ndarray, codec: tuple) -> bytes:
+    """
+    Encode pixels with a codec of _image_codec(), big images in the worker processes.
+    When they can not start (a main script without an `if __name__ == "__main__":` guard),
+    every image is encoded in this process instead.
+    """
+    global _encodeInline
+    if _encodeInline or pixels.shape[0] * pixels.shape[1] <= ENCODE_INLINE_PIXELS:
+        return _encode_image(pixels, *codec)
+    try:
+        return _process_pool().submit(_encode_image, pixels, *codec).result()
+    except (concurrent.futures.BrokenExecutor, RuntimeError) as e:
+        if getattr(multiprocessing.current_process(), "_inheriting", False):
+            # A starting worker importing the unguarded main script (the check of multiprocessing
+            # itself): it must fail, not run the script on.
+            raise
+        _encodeInline = True
+        logging.warning(f"Encoder Processes Unavailable, Encoding In This Process: {e}")
+        return _encode_image(pixels, *codec)
+
+
+def _capture_screenshot(args: list) -> bytes:
+    # args : Monitor, x, y, width, height, scale, codec
+    codec = _image_codec(args[6] if len(args) > 6 else "")
+    with screen_capture_engine.acquire(int(args[0]), SCREEN_SHARE_TIME) as pixels:
+        return _encode(_screenshot_pixels(pixels, args[1:6]), codec)
+
+
+@eventHandler(HANDLER_THREAD)
+def catchScreenshot(remote: RemoteConnection, args: list) -> bytes:
+    """Catch The Screenshot of This Computer, returns it encoded (PNG by default)."""
     # args[0] : Monitor Number(int)
-    with mss.mss() as sct:
-        monitors = sct.monitors[1:]
-    monitor = int(args[0])
-    with mss.mss() as sct:
-        screenshot = sct.grab(monitors[monitor])
-        mss.tools.to_png(
-            screenshot.rgb, screenshot.size, output=f"tmp_screenshot_{monitor}.png"
-        )
+    # args[1:5] : Region(int) x, y, width, height in the monitor, default: the whole monitor
+    # args[5] : Scale(float), between 0 and 1, default: 1
+    # args[6] : Codec(str), "png", "raw", "jpeg" or "webp" with a quality ("jpeg:high", "webp:80"), default: png
+    # Encoded once, straight into memory.
+    return _capture_screenshot(args)
 
 
+@eventHandler(HANDLER_THREAD, ordered="screen")
 def sendScreenshot(remote: RemoteConnection, args: list):
     """Send The Screenshot of This Computer"""
     # args[0] : Monitor Number(int)
+    # args[1] : Is show image(bool), default: false
+    # args[2:6] : Region(int) x, y, width, height in the monitor, default: the whole monitor
+    # args[6] : Scale(float), between 0 and 1, default: 1
+    # args[7] : Codec(str), see catchScreenshot, default: png
+    # A new screenshot, with this region, scale and codec, goes in a single FRAME_DATA frame.
     monitor = int(args[0])
-    remote.sendString(f"sendFile|tmp_screenshot_{monitor}.png")
+    png = _capture_screenshot(args[:1] + args[2:])
+    show = args[1] if len(args) > 1 else "false"
+    with _request_stream(remote):
+        remote.sendString(f"reciveScreenshot|{monitor},{show},")
+        remote.send(png, channel=CHANNEL_SCREEN)
+
+
+def _store_screenshot(remote, args: list, msgType: int, png: bytes):
+    if msgType != FRAME_DATA:
+        raise RemoteToolkitError(f"Unexpected frame (type {msgType}) while receiving screenshot.")
+    monitor = int(args[0])
+    remote.state.setdefault("screenshots", {})[monitor] = png
+    if len(args) > 1 and args[1].lower() == "true":
+        showScreenshot(remote, args)
+
+
+def reciveScreenshot(remote: RemoteConnection, args: list):
+    """Passive screenshot-receiving function, generally do not call directly."""
+    # args[0] : Monitor Number(int)
+    # args[1] : Is show image(bool), default: false
+    msgType, _, png = remote.recvFrame(CHANNEL_SCREEN)
+    _store_screenshot(remote, args, msgType, png)
 
 
 def showScreenshot(remote: RemoteConnection, args: list):
-    """Get Screenshot of Remote Computer"""
+    """Show the last Screenshot received from Remote Computer"""
     # args[0] : Monitor Number(int)
-    monitor = int(args[0])
-    img = PIL.Image.open(f"tmp_screenshot_{monitor}.png")
-    img.show()
+    png = remote.state.get("screenshots", {}).get(int(args[0]))
+    if png is None:
+        raise RemoteToolkitError(f"No screenshot of monitor {args[0]} was received.")
+    PIL.Image.open(io.BytesIO(png)).show()
 
 
 def getScreenshot(remote: RemoteConnection, args: list):
     """Get Screenshot of Remote Computer"""
     # args[0] : Monitor Number(int)
     # args[1] : Is show image(bool) , default: false
-    monitor = int(args[0])
-    if len(args) == 1:
-        args[1] = "false"
-    remote.sendString(f"catchScreenshot|{monitor}")
-    remote.sendString(f"sendScreenshot|{monitor}")
-    if args[1].lower() == "true":
-        showScreenshot(remote, ArgsFormater(args[0]))
+    # args[2:6] : Region(int) x, y, width, height in the monitor, default: the whole monitor
+    # args[6] : Scale(float), between 0 and 1, default: 1
+    # args[7] : Codec(str), see catchScreenshot, default: png
+    # The region is cropped and scaled by the remote computer, before encoding.
+    # The image is kept in remote.state["screenshots"][monitor] by reciveScreenshot.
+    show = args[1] if len(args) > 1 else "false"
+    remote.sendString(f"sendScreenshot|{int(args[0])},{show},{','.join(map(str, args[2:8]))},")
 
 
+@eventHandler(HANDLER_THREAD)
 def monitorRemoteScreen(remote: RemoteConnection, args: list):
     """Monitor the remote screen continuously."""
     # args[0] : Monitor Number(int)
-    # args[1] : Interval between screenshots in seconds (int)
+    # args[1] : Interval between screenshots in seconds (float)
+    # args[2] : Codec(str), see catchScreenshot, default: png
+    # Only the tiles which changed are sent, the screen is rebuilt in remote.state["screens"][monitor].
+    # At most SCREEN_MAX_IN_FLIGHT frames are requested ahead: when the link or the remote
+    # computer is slower than the interval, frames are skipped instead of queued, and the
+    # next delta holds all the changes since the last frame received.
     monitor = int(args[0])
-    interval = int(args[1])
+    interval = float(args[1])
+    codec = args[2] if len(args) > 2 else ""
+    stream = remote.state.setdefault("screenMonitors", {}).setdefault(monitor, _ScreenStream())
+    nextFrame = time.perf_counter()
     while remote.connect:
-        remote.sendString(f"catchScreenshot|{monitor}")
-        remote.sendString(f"sendScreenshot|{monitor}")
-        time.sleep(interval)
+        if stream.request(interval):
+            keyframe = monitor not in remote.state.get("screens", {})
+            remote.sendString(f"sendScreenDelta|{monitor},{keyframe},{codec},")
+        # The remote computer cannot send frames faster than it encodes them.
+        nextFrame = max(nextFrame + max(interval, stream.encodeTime), time.perf_counter() - interval)
+        time.sleep(max(nextFrame - time.perf_counter(), 0))
+
+
+class _ScreenStream:
+    """Viewer side of monitorRemoteScreen: frames in flight and delivery statistics."""
+
+    def __init__(self, maxInFlight=SCREEN_MAX_IN_FLIGHT):
+        self._window = threading.Semaphore(maxInFlight)
+        self._requested = collections.deque()
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.skipped = 0
+        self.encodeTime = 0.0  # Moving averages, in seconds
+        self.deliveryTime = 0.0
+        self.started = time.perf_counter()
+
+    def request(self, timeout: float) -> bool:
+        """Take a place for one more frame, False (frame skipped) if the viewer lags."""
+        if not self._window.acquire(timeout=timeout):
+            self.skipped += 1
+            return False
+        with self._lock:
+            self._requested.append(time.perf_counter())
+        return True
+
+    def delivered(self, encodeTime: float):
+        now = time.perf_counter()
+        with self._lock:
+            requested = self._requested.popleft() if self._requested else now
+            self.frames += 1
+            self.encodeTime += (encodeTime - self.encodeTime) / min(self.frames, 8)
+            self.deliveryTime += (now - requested - self.deliveryTime) / min(self.frames, 8)
+        self._window.release()
+
+    def stats(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "fps": self.frames / elapsed if elapsed else 0.0,
+            "encodeTime": self.encodeTime,
+            "deliveryTime": self.deliveryTime,
+        }
+
+
+def _changed_tiles(frame: numpy.ndarray, previous: numpy.ndarray, size: int) -> numpy.ndarray:
+    """(row, column) of the tiles which differ between two frames of the same size."""
+    changed = (frame != previous).any(axis=2)
+    rows, cols = -(-changed.shape[0] // size), -(-changed.shape[1] // size)
+    changed = numpy.pad(changed, ((0, rows * size - changed.shape[0]), (0, cols * size - changed.shape[1])))
+    return numpy.argwhere(changed.reshape(rows, size, cols, size).any(axis=(1, 3)))
+
+
+def _tile_grid_columns(count: int) -> int:
+    """
+    Columns of the square-ish grid the changed tiles are laid out in: a single column
+    of thousands of tiles would exceed the height WebP (16383) and JPEG (65500) allow.
+    """
+    return math.ceil(math.sqrt(count))
+
+
+def _encode_screen_delta(frame: numpy.ndarray, tiles: numpy.ndarray, size: int, codec: tuple) -> bytes:
+    """Number of tiles, their positions, then all the tiles laid out row by row in one image."""
+    payload = [SCREEN_TILES.pack(len(tiles))]
+    if len(tiles):
+        cols = _tile_grid_columns(len(tiles))
+        grid = numpy.zeros((-(-len(tiles) // cols) * size, cols * size, 3), numpy.uint8)
+        for i, (row, col) in enumerate(tiles):
+            tile = frame[row * size:(row + 1) * size, col * size:(col + 1) * size]
+            y, x = i // cols * size, i % cols * size
+            grid[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+            payload.append(SCREEN_TILE.pack(row, col))
+        payload.append(_encode(grid, codec))
+    return b"".join(payload)
+
+
+@eventHandler(HANDLER_THREAD, ordered="screen")
+def sendScreenDelta(remote: RemoteConnection, args: list):
+    """Send the tiles of the screen which changed since the last sendScreenDelta"""
+    # args[0] : Monitor Number(int)
+    # args[1] : Is keyframe(bool), send the whole screen, default: false
+    # args[2] : Codec(str), see catchScreenshot, default: png
+    # Every SCREEN_KEYFRAME_INTERVAL frames, or when the screen size changes, the whole screen is sent.
+    started = time.perf_counter()
+    monitor = int(args[0])
+    codec = _image_codec(args[2] if len(args) > 2 else "")
+    # The previous frame stays acquired until the next one was compared with it.
+    captured = screen_capture_engine.acquire(monitor, SCREEN_SHARE_TIME)
+    frame = captured.pixels
+    streams = remote.state.setdefault("screenStreams", {})
+    previous, count = streams.get(monitor, (None, 0))
+    try:
+        if (
+            previous is None or previous.pixels.shape != frame.shape or count >= SCREEN_KEYFRAME_INTERVAL
+            or (len(args) > 1 and args[1].lower() == "true")
+        ):
+            kind, payload, count = "key", _encode(frame, codec), 0
+        else:
+            tiles = [] if previous is captured else _changed_tiles(frame, previous.pixels, SCREEN_TILE_SIZE)
+            kind, payload = "delta", _encode_screen_delta(frame, tiles, SCREEN_TILE_SIZE, codec)
+    except BaseException:
+        captured.release()
+        raise
+    streams[monitor] = (captured, count + 1)
+    if previous is not None:
+        previous.release()
+    with _request_stream(remote):
+        remote.sendString(f"reciveScreenDelta|{monitor},{kind},{SCREEN_TILE_SIZE},{time.perf_counter() - started:.4f},")
+        remote.send(payload, channel=CHANNEL_SCREEN)
+
+
+def _apply_screen_delta(remote, args: list, msgType: int, payload: bytes):
+    stream = remote.state.get("screenMonitors", {}).get(int(args[0]))
+    try:
+        _update_screen(remote, args, msgType, payload)
+    finally:
+        if stream is not None:
+            stream.delivered(float(args[3]) if len(args) > 3 else 0.0)
+
+
+def _update_screen(remote, args: list, msgType: int, payload: bytes):
+    if msgType != FRAME_DATA:
+        raise RemoteToolkitError(f"Unexpected frame (type {msgType}) while receiving screen.")
+    monitor, size = int(args[0]), int(args[2])
+    screens = remote.state.setdefault("screens", {})
+    if args[1] == "key":
+        screens[monitor] = numpy.array(PIL.Image.open(io.BytesIO(payload)).convert("RGB"))
+        return
+    frame = screens.get(monitor)
+    if frame is None:
+        raise RemoteToolkitError(f"Delta frame of monitor {monitor} received before its keyframe.")
+    (count,) = SCREEN_TILES.unpack_from(payload)
+    if count == 0:
+        return
+    tilesEnd = SCREEN_TILES.size + count * SCREEN_TILE.size
+    grid = numpy.asarray(PIL.Image.open(io.BytesIO(payload[tilesEnd:])).convert("RGB"))
+    cols = _tile_grid_columns(count)
+    for i, (row, col) in enumerate(SCREEN_TILE.iter_unpack(payload[SCREEN_TILES.size:tilesEnd])):
+        tile = frame[row * size:(row + 1) * size, col * size:(col + 1) * size]
+        y, x = i // cols * size, i % cols * size
+        tile[...] = grid[y:y + tile.shape[0], x:x + tile.shape[1]]
+
+
+def reciveScreenDelta(remote: RemoteConnection, args: list):
+    """Passive screen-receiving function, generally do not call directly."""
+    # args[0] : Monitor Number(int)
+    # args[1] : Frame Kind(str), "key" or "delta"
+    # args[2] : Tile Size(int)
+    # args[3] : Encoding Time(float, s)
+    # The screen is rebuilt in remote.state["screens"][monitor] (RGB numpy array).
+    msgType, _, payload = remote.recvFrame(CHANNEL_SCREEN)
+    _apply_screen_delta(remote, args, msgType, payload)
+
+
+async def reciveScreenDeltaAsync(remote: AsyncRemoteConnection, args: list):
+    """reciveScreenDelta for AsyncRemoteConnection."""
+    # args : Same as reciveScreenDelta
+    msgType, _, payload = await remote.recvFrame(CHANNEL_SCREEN)
+    _apply_screen_delta(remote, args, msgType, payload)
+
+
+def _async_unsupported(name: str):
+    """Handler standing for a built-in AsyncRemoteConnection does not implement: fails with a clear error."""
+
+    def unsupported(remote: AsyncRemoteConnection, args: list):
+        raise RemoteToolkitError(f"{name} is not supported by AsyncRemoteConnection.")
+
+    return unsupported
+
+
+async def reciveScreenshotAsync(remote: AsyncRemoteConnection, args: list):
+    """reciveScreenshot for AsyncRemoteConnection."""
+    # args : Same as reciveScreenshot
+    msgType, _, png = await remote.recvFrame(CHANNEL_SCREEN)
+    _store_screenshot(remote, args, msgType, png)
 
 
 builtin_funcs = {
     "Close": closeRemote,
     "sendPathList": sendPathList,
     "getPathList": getPathList,
+    "listPath": listPath,
     "sendFile": sendFile,
     "reciveFile": reciveFile,
+    "reciveFileStriped": reciveFileStriped,
     "getFile": getFile,
+    "sendFileDelta": sendFileDelta,
+    "reciveFileDelta": reciveFileDelta,
+    "getFileDelta": getFileDelta,
+    "sendDirectory": sendDirectory,
+    "reciveDirectory": reciveDirectory,
+    "getDirectory": getDirectory,
     "catchScreenshot": catchScreenshot,
     "sendScreenshot": sendScreenshot,
+    "reciveScreenshot": reciveScreenshot,
     "showScreenshot": showScreenshot,
+    "sendScreenDelta": sendScreenDelta,
+    "reciveScreenDelta": reciveScreenDelta,
     "getScreenshot": getScreenshot,
     "monitorRemoteScreen": monitorRemoteScreen,
 }
 
+# Built-in handlers for AsyncRemoteConnection: the ones reading from the remote
+# computer are replaced by coroutines, the others are shared (HANDLER_THREAD ones run
+# in the default executor of the loop). Directory, delta and striped transfers read
+# through blocking calls, and monitorRemoteScreen never returns while listen waits for
+# it: they fail instead, the other computer gets the error.
+async_builtin_funcs = dict(
+    builtin_funcs,
+    getPathList=getPathListAsync,
+    sendFile=sendFileAsync,
+    reciveFile=reciveFileAsync,
+    reciveFileStriped=_async_unsupported("reciveFileStriped"),
+    reciveScreenshot=reciveScreenshotAsync,
+    reciveScreenDelta=reciveScreenDeltaAsync,
+    sendFileDelta=_async_unsupported("sendFileDelta"),
+    reciveFileDelta=_async_unsupported("reciveFileDelta"),
+    sendDirectory=_async_unsupported("sendDirectory"),
+    reciveDirectory=_async_unsupported("reciveDirectory"),
+    monitorRemoteScreen=_async_unsupported("monitorRemoteScreen"),
+)
+
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["fanout"]:
+        sys.exit(_fan_out_main(sys.argv[2:]))
     remote = RemoteConnection(WRCT_ANY_IP_ADDRESS, 12345, True)
     remote.initiativeConnect(30)
     remote.listen(builtin_funcs)
@@ -0,0 +1,637 @@
+"""
+Loopback tests: two RemoteConnection objects of this process talk over 127.0.0.1,
+both listening, and the built-in requests are called directly like a program would.
+Run with: python -m unittest discover tests
+"""
+
+import gc
+import re
+import io
+import asyncio
+import os
+import sys
+import time
+import socket
+import tempfile
+import subprocess
+import threading
+import unittest
+import contextlib
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import RemoteConnectionToolkit as RCT
+
+RCT._loggingReady = True  # No log files in the working directory
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _connected_pair(serverSettings: dict, clientSettings: dict) -> tuple:
+    """A server and a client connected over 127.0.0.1, with their attributes set before connecting."""
+    port = _free_port()
+    server = RCT.RemoteConnection(RCT.WRCT_ANY_IP_ADDRESS, port)
+    client = RCT.RemoteConnection("127.0.0.1", port)
+    for remote, settings in ((server, serverSettings), (client, clientSettings)):
+        remote.host = "127.0.0.1"
+        for name, value in settings.items():
+            setattr(remote, name, value)
+    accepting = threading.Thread(target=server.passiveConnect, args=(5,))
+    accepting.start()
+    for _ in range(50):
+        try:
+            client.initiativeConnect(5)
+            break
+        except ConnectionRefusedError:
+            # The server is not listening yet.
+            client.socketObject.close()
+            client.socketObject = socket.socket()
+            time.sleep(0.05)
+    accepting.join(5)
+    return server, client
+
+
+class LoopbackCase(unittest.TestCase):
+    settings = {}  # Attributes of both connections, set before connecting
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.received = os.path.join(self.folder.name, "received.bin")
+        self.server, self.client = _connected_pair(self.settings, self.settings)
+
+        @RCT.eventHandler(RCT.HANDLER_THREAD, ordered="recive")
+        def reciveFile(remote, args):
+            # The sent file stays untouched: it is received under another name.
+            return RCT.reciveFile(remote, [self.received] + args[1:])
+
+        @RCT.eventHandler(RCT.HANDLER_THREAD, ordered="recive")
+        def reciveFileStriped(remote, args):
+            return RCT.reciveFileStriped(remote, [self.received] + args[1:])
+
+        @RCT.eventHandler(RCT.HANDLER_THREAD, ordered="recive")
+        def reciveFileDelta(remote, args):
+            return RCT.reciveFileDelta(remote, [self.received] + args[1:])
+
+        # Shared by both listeners, tests may add handlers.
+        self.funcs = dict(
+            RCT.builtin_funcs, reciveFile=reciveFile, reciveFileStriped=reciveFileStriped, reciveFileDelta=reciveFileDelta
+        )
+        self.listeners = [
+            threading.Thread(target=remote.listen, args=(self.funcs,), daemon=True) for remote in (self.server, self.client)
+        ]
+        for listener in self.listeners:
+            listener.start()
+
+    def tearDown(self):
+        RCT.closeRemote(self.client, [])
+        for listener in self.listeners:
+            listener.join(5)
+        self.server.socketObject.close()
+
+    def _file(self, size: int) -> str:
+        path = os.path.join(self.folder.name, f"sent{size}.bin")
+        with open(path, "wb") as file:
+            file.write(os.urandom(size))
+        return path
+
+    def _listing(self, path: str):
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            cursor = RCT.getPathList(self.client, [path])
+        return cursor, output.getvalue()
+
+    def _assertReceived(self, path: str, timeout=10.0):
+        # sendFile returns once everything is sent, the receiver may still be writing.
+        with open(path, "rb") as sent:
+            content = sent.read()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with contextlib.suppress(FileNotFoundError), open(self.received, "rb") as received:
+                if received.read() == content:
+                    return
+            time.sleep(0.01)
+        self.fail(f"{self.received} does not match {path}")
+
+
+class LoopbackTest(LoopbackCase):
+    def test_direct_requests_while_listening(self):
+        # The replies may arrive before the requester waits for them: they must not be dropped.
+        path = self._file(300_000)
+        for _ in range(20):
+            cursor, output = self._listing(self.folder.name)
+            self.assertIsNone(cursor)
+            self.assertIn("sent300000.bin", output)
+            RCT.sendFile(self.client, [path])
+            self._assertReceived(path)
+            os.remove(self.received)
+
+    def test_listing_during_file_transfer(self):
+        path = self._file(20_000_000)
+        sending = threading.Thread(target=RCT.sendFile, args=(self.client, [path]))
+        sending.start()
+        for _ in range(5):
+            self.assertIn("sent20000000.bin", self._listing(self.folder.name)[1])
+        sending.join(30)
+        self.assertFalse(sending.is_alive())
+        self._assertReceived(path)
+
+    def test_queued_handlers_calling_back(self):
+        # More lane handlers than handler slots, each waiting for a call() only listen can answer.
+        answers = []
+
+        @RCT.eventHandler(RCT.HANDLER_THREAD, ordered="lane")
+        def ask(remote, args):
+            answers.append(remote.call("echo", args[0], timeout=10))
+
+        self.funcs.update(ask=ask, echo=lambda remote, args: args[0])
+        count = 2 * RCT.HANDLER_THREADS
+        for i in range(count):
+            self.client.sendString(f"ask|{i},")
+        deadline = time.monotonic() + 10
+        while len(answers) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(answers, [str(i) for i in range(count)])
+
+    def test_failed_handler_aborts_the_request(self):
+        with self.assertRaises(RCT.RemoteToolkitError):
+            self._listing(os.path.join(self.folder.name, "missing"))
+        # The connection goes on.
+        self._file(10)
+        self.assertIn("sent10.bin", self._listing(self.folder.name)[1])
+
+    def test_resume_after_corrupted_chunk(self):
+        # A first transfer got one chunk through, then the checksum of the next one failed.
+        path = self._file(3_000_000)
+        with open(path, "rb") as file:
+            content = file.read()
+        source = [len(content), os.stat(path).st_mtime_ns]
+        receiver = RCT._FileReceiver(self.received, source)
+        receiver.write(content[:1_000_000])
+        receiver.checkChunk(RCT.CHUNK_CHECKSUM.pack(0, 0, RCT.zlib.crc32(content[:1_000_000])))
+        receiver.write(b"x" * 1_000_000)
+        with self.assertRaisesRegex(RCT.RemoteToolkitError, "Chunk 1 .* is corrupted"):
+            receiver.checkChunk(RCT.CHUNK_CHECKSUM.pack(1, 1_000_000, RCT.zlib.crc32(content[1_000_000:2_000_000])))
+        receiver.close()
+        self.assertEqual(os.path.getsize(self.received + ".part"), 1_000_000)
+
+        with self.assertLogs(level="INFO") as logs:
+            RCT.sendFile(self.client, [path])
+        self.assertIn("Resuming File Transfer From Byte 1000000", "\n".join(logs.output))
+        self._assertReceived(path)
+        self.assertFalse(os.path.exists(self.received + ".part.json"))
+
+    def test_changed_source_is_sent_again(self):
+        path = self._file(100_000)
+        with open(self.received + ".part", "wb") as part:
+            part.write(b"old")
+        with open(self.received + ".part.json", "w") as journal:
+            RCT.json.dump({"source": [100_000, 0], "verified": 3}, journal)
+        RCT.sendFile(self.client, [path])
+        self._assertReceived(path)
+
+    def test_striped_transfer(self):
+        self.client.fileChunkSize = 1 << 20
+        path = self._file(5_500_000)
+        RCT.sendFile(self.client, [path, "3"])
+        self._assertReceived(path)
+        self.assertFalse(os.path.exists(self.received + ".part"))
+
+    def test_delta_transfer(self):
+        old = os.urandom(1_000_000)
+        # Bytes inserted near the start shift all the blocks after them, one block is changed.
+        new = old[:1000] + os.urandom(300) + old[1000:500_000] + os.urandom(4000) + old[504_000:]
+        with open(self.received, "wb") as file:
+            file.write(old)
+        path = os.path.join(self.folder.name, "sent.bin")
+        with open(path, "wb") as file:
+            file.write(new)
+        with self.assertLogs(level="INFO") as logs:
+            RCT.sendFileDelta(self.client, [path])
+        self._assertReceived(path)
+        message = next(line for line in logs.output if "Delta Transfer" in line)
+        sent, reused = map(int, re.findall(r"(\d+) Bytes", message))
+        self.assertEqual(sent + reused, len(new))
+        self.assertLess(sent, 20_000)
+
+    def test_screen_delta_round_trip(self):
+        previous = numpy.random.default_rng(0).integers(0, 255, (300, 400, 3), dtype=numpy.uint8)
+        frame = previous.copy()
+        frame[10:20, 100:300] = 255
+        frame[250:, 390:] = 0  # Partial tiles at the edges
+        codec = RCT._image_codec("png")
+
+        def send(kind: str, payload: bytes, expected):
+            with RCT._request_stream(self.client):
+                self.client.sendString(f"reciveScreenDelta|0,{kind},64,0,")
+                self.client.send(payload, channel=RCT.CHANNEL_SCREEN)
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                screen = self.server.state.get("screens", {}).get(0)
+                if screen is not None and numpy.array_equal(screen, expected):
+                    return
+                time.sleep(0.01)
+            self.fail(f"The {kind} frame was not applied")
+
+        send("key", RCT._encode(previous, codec), previous)
+        tiles = RCT._changed_tiles(frame, previous, 64)
+        self.assertEqual(len(tiles), 6)
+        send("delta", RCT._encode_screen_delta(frame, tiles, 64, codec), frame)
+
+
+class ResumeTest(LoopbackCase):
+    settings = {"autoReconnect": True, "reconnectDelay": 0.1}
+
+    def _cut(self):
+        # Like a network outage: both ends lose the connection, the session stays.
+        self.client.clientObject.shutdown(socket.SHUT_RDWR)
+
+    def test_calls_across_a_disconnect(self):
+        self.funcs.update(echo=lambda remote, args: args[0])
+        with self.assertLogs(level="INFO") as logs:
+            futures = [self.client.callFuture("echo", i) for i in range(50)]
+            self._cut()
+            futures += [self.client.callFuture("echo", i) for i in range(50, 100)]
+            answers = [future.result(10) for future in futures]
+        self.assertEqual(answers, [str(i) for i in range(100)])
+        self.assertTrue(any("Resumed" in line for line in logs.output))
+        self.assertEqual((self.client._generation, self.server._generation), (1, 1))
+
+    def test_file_transfer_across_a_disconnect(self):
+        path = self._file(20_000_000)
+        sending = threading.Thread(target=RCT.sendFile, args=(self.client, [path]))
+        sending.start()
+        # Once the receiver wrote something, the sender still waits for window updates.
+        deadline = time.monotonic() + 10
+        while not (os.path.exists(self.received + ".part") and os.path.getsize(self.received + ".part")):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+        self.assertTrue(sending.is_alive())
+        self._cut()
+        sending.join(30)
+        self.assertFalse(sending.is_alive())
+        self._assertReceived(path)
+        self.assertEqual(self.client._generation, 1)
+
+
+class CompressionTest(LoopbackCase):
+    settings = {"compression": "zlib"}
+
+    def test_compressed_transfer(self):
+        self.assertEqual((self.client.codec, self.server.codec), ("zlib", "zlib"))
+        path = os.path.join(self.folder.name, "sent.txt")
+        with open(path, "w") as file:
+            file.write("compressible line\n" * 200_000)
+        RCT.sendFile(self.client, [path])
+        self._assertReceived(path)
+        stats = self.client.getCompressionStats()
+        self.assertEqual(stats["codec"], "zlib")
+        self.assertLess(stats["ratio"], 0.1)
+
+    def test_negotiation(self):
+        # The client picks its own preference among the codecs the server offers.
+        for serverCodec, clientCodec, expected in (("zlib", "lzma", "lzma"), (None, "zlib", None), ("zlib", None, None)):
+            server, client = _connected_pair({"compression": serverCodec}, {"compression": clientCodec})
+            self.assertEqual((server.codec, client.codec), (expected, expected))
+            for sock in (client.clientObject, server.clientObject, server.socketObject):
+                sock.close()
+
+
+class HeartbeatTest(unittest.TestCase):
+    def test_silent_peer_is_disconnected(self):
+        server, client = _connected_pair({}, {"heartbeatInterval": 0.2})
+        self.addCleanup(server.socketObject.close)
+        self.addCleanup(server.clientObject.close)
+        # The server never listens, so it never answers the pings.
+        listener = threading.Thread(target=client.listen, args=(RCT.builtin_funcs,), daemon=True)
+        listener.start()
+        listener.join(10)
+        self.assertFalse(listener.is_alive())
+        self.assertFalse(client.connect)
+
+    def test_answered_pings_are_measured(self):
+        server, client = _connected_pair({}, {"heartbeatInterval": 0.1})
+        listeners = [threading.Thread(target=remote.listen, args=(RCT.builtin_funcs,), daemon=True) for remote in (server, client)]
+        for listener in listeners:
+            listener.start()
+        time.sleep(0.6)
+        stats = client.getLatencyStats()
+        RCT.closeRemote(client, [])
+        for listener in listeners:
+            listener.join(5)
+        server.socketObject.close()
+        self.assertGreater(stats["samples"], 2)
+
+
+class ServeTest(unittest.TestCase):
+    def setUp(self):
+        @RCT.eventHandler(RCT.HANDLER_THREAD)
+        def slow(remote, args):
+            time.sleep(float(args[0]))
+            return args[0]
+
+        def count(remote, args):
+            remote.state["calls"] = remote.state.get("calls", 0) + 1
+            return remote.state["calls"]
+
+        self.port = _free_port()
+        self.server = RCT.RemoteConnection(RCT.WRCT_ANY_IP_ADDRESS, self.port)
+        self.server.host = "127.0.0.1"
+        funcs = dict(RCT.builtin_funcs, slow=slow, count=count)
+        self.serving = threading.Thread(target=self.server.serve, args=(funcs, 2, 5), daemon=True)
+        self.serving.start()
+        time.sleep(0.1)
+
+    def tearDown(self):
+        self.server.stopServe()
+        self.serving.join(5)
+
+    def _client(self, connected=True) -> RCT.RemoteConnection:
+        client = RCT.RemoteConnection("127.0.0.1", self.port)
+        client.host = "127.0.0.1"
+        self.addCleanup(RCT.closeRemote, client, [])
+        if connected:
+            client.initiativeConnect(5)
+            threading.Thread(target=client.listen, args=(RCT.builtin_funcs,), daemon=True).start()
+        return client
+
+    def test_sessions_are_apart(self):
+        first, second = self._client(), self._client()
+        for _ in range(3):
+            first.call("count", timeout=5)
+        self.assertEqual(second.call("count", timeout=5), 1)
+        self.assertEqual(first.call("count", timeout=5), 4)
+        self.assertEqual(len(self.server.sessions), 2)
+
+        # Beyond maxSessions, a client waits until a session ends.
+        third = self._client(connected=False)
+        connecting = threading.Thread(target=third.initiativeConnect, args=(5,))
+        connecting.start()
+        connecting.join(0.5)
+        self.assertTrue(connecting.is_alive())
+        RCT.closeRemote(first, [])
+        connecting.join(5)
+        threading.Thread(target=third.listen, args=(RCT.builtin_funcs,), daemon=True).start()
+        self.assertEqual(third.call("count", timeout=5), 1)
+
+    def test_pool_reuses_and_evicts(self):
+        pool = RCT.RemoteConnectionPool(maxSize=1, maxIdle=0.3, healthCheckInterval=0.2)
+        self.addCleanup(pool.close)
+        first = pool.checkout("127.0.0.1", self.port)
+        second = pool.checkout("127.0.0.1", self.port)  # The first one is busy
+        self.assertIsNot(first, second)
+        pool.checkin(first)
+        pool.checkin(second)  # Beyond maxSize, the least recently used one is closed
+        self.assertEqual(len(pool), 1)
+        with pool.connection("127.0.0.1", self.port) as remote:
+            self.assertIs(remote, second)
+            self.assertEqual(remote.call("slow", 0, timeout=5), "0")
+        self.assertEqual(pool.stats, {"created": 2, "reused": 1, "evicted": 1})
+        deadline = time.monotonic() + 5
+        while len(pool) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(len(pool), 0)  # Idle for longer than maxIdle
+        self.assertEqual(pool.stats["evicted"], 2)
+
+    def test_fan_out_timeout_and_summary(self):
+        # A host which accepts connections but never answers the handshake.
+        silent = socket.socket()
+        self.addCleanup(silent.close)
+        silent.bind(("127.0.0.1", 0))
+        silent.listen(1)
+        hosts = [f"127.0.0.1:{self.port}", ("127.0.0.1", silent.getsockname()[1])]
+        results = list(RCT.fanOut(hosts, "slow", 0.05, timeout=1))
+        self.assertEqual([result.port for result in results], [self.port, silent.getsockname()[1]])
+        self.assertEqual(results[0].value, "0.05")
+        self.assertTrue(results[1].timedOut)
+        summary = RCT.fanOutSummary(results)
+        self.assertEqual((summary["hosts"], summary["ok"], summary["failed"], summary["timedOut"]), (2, 1, 1, 1))
+        self.assertEqual([straggler["port"] for straggler in summary["stragglers"]], [silent.getsockname()[1]])
+
+        # A handler answering too late.
+        (result,) = RCT.fanOut([f"127.0.0.1:{self.port}"], "slow", 2, timeout=0.3)
+        self.assertTrue(result.timedOut)
+        self.assertRegex(str(result.error), "No answer")
+        self.assertLess(result.elapsed, 1)
+
+
+class AsyncLoopbackTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        port = _free_port()
+        self.server = RCT.AsyncRemoteConnection(RCT.WRCT_ANY_IP_ADDRESS, port)
+        self.server.host = "127.0.0.1"
+        self.client = RCT.AsyncRemoteConnection("127.0.0.1", port)
+        self.client.host = "127.0.0.1"
+        accepting = asyncio.create_task(self.server.passiveConnect(5))
+        await asyncio.sleep(0.1)
+        await self.client.initiativeConnect(5)
+        await accepting
+
+    async def asyncTearDown(self):
+        RCT.closeRemote(self.client, [])
+        await asyncio.wait_for(asyncio.gather(*self.listeners, return_exceptions=True), 5)
+
+    async def _listen(self, serverFuncs: dict, clientFuncs: dict):
+        self.listeners = [
+            asyncio.create_task(self.server.listen(serverFuncs)),
+            asyncio.create_task(self.client.listen(clientFuncs)),
+        ]
+        await asyncio.sleep(0)  # listen() runs
+
+    async def test_thread_handler_does_not_block_the_loop(self):
+        marks = asyncio.Queue()
+
+        @RCT.eventHandler(RCT.HANDLER_THREAD)
+        def slow(remote, args):
+            time.sleep(0.5)
+            with RCT._request_stream(remote):
+                remote.sendString(f"mark|{args[0]},")
+
+        async def mark(remote, args):
+            await marks.put(args[0])
+
+        await self._listen(dict(RCT.async_builtin_funcs, slow=slow), dict(RCT.async_builtin_funcs, mark=mark))
+        self.client.sendString("slow|done,")
+        await self.client.drain()
+        ticks = 0
+        while marks.empty():
+            await asyncio.sleep(0.01)
+            ticks += 1
+        self.assertEqual(await marks.get(), "done")
+        self.assertGreater(ticks, 20)
+
+    async def test_monitor_is_refused(self):
+        await self._listen(RCT.async_builtin_funcs, RCT.async_builtin_funcs)
+        with self.assertRaisesRegex(RCT.RemoteToolkitError, "monitorRemoteScreen is not supported"):
+            await self.client.call("monitorRemoteScreen", 0, 0.1, timeout=5)
+
+
+class InteropTest(unittest.IsolatedAsyncioTestCase):
+    """An AsyncRemoteConnection of the event loop talking with a RemoteConnection run by threads."""
+
+    async def asyncSetUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.received = os.path.join(self.folder.name, "received.bin")
+        self.sent = os.path.join(self.folder.name, "sent.bin")
+        with open(self.sent, "wb") as file:
+            file.write(os.urandom(5_000_000))
+        self.port = _free_port()
+
+    async def _assertReceived(self, timeout=10.0):
+        with open(self.sent, "rb") as sent:
+            content = sent.read()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with contextlib.suppress(FileNotFoundError), open(self.received, "rb") as received:
+                if received.read() == content:
+                    return
+            await asyncio.sleep(0.01)
+        self.fail(f"{self.received} does not match {self.sent}")
+
+    async def test_sync_client_async_server(self):
+        async def reciveFile(remote, args):
+            await RCT.reciveFileAsync(remote, [self.received] + args[1:])
+
+        server = RCT.AsyncRemoteConnection(RCT.WRCT_ANY_IP_ADDRESS, self.port)
+        server.host = "127.0.0.1"
+        client = RCT.RemoteConnection("127.0.0.1", self.port)
+        client.host = "127.0.0.1"
+        accepting = asyncio.create_task(server.passiveConnect(5))
+        await asyncio.sleep(0.1)
+        await asyncio.to_thread(client.initiativeConnect, 5)
+        await accepting
+        serving = asyncio.create_task(server.listen(dict(RCT.async_builtin_funcs, reciveFile=reciveFile)))
+        listener = threading.Thread(target=client.listen, args=(RCT.builtin_funcs,), daemon=True)
+        listener.start()
+
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            await asyncio.to_thread(RCT.getPathList, client, [self.folder.name])
+        self.assertIn("sent.bin", output.getvalue())
+        await asyncio.to_thread(RCT.sendFile, client, [self.sent])
+        await self._assertReceived()
+        page = await asyncio.to_thread(client.call, "listPath", self.folder.name, 0, 10, timeout=5)
+        self.assertEqual(sorted(entry["name"] for entry in page["entries"]), ["received.bin", "sent.bin"])
+        RCT.closeRemote(client, [])
+        await asyncio.wait_for(serving, 5)
+        await asyncio.to_thread(listener.join, 5)
+
+    async def test_async_client_sync_server(self):
+        @RCT.eventHandler(RCT.HANDLER_THREAD, ordered="recive")
+        def reciveFile(remote, args):
+            return RCT.reciveFile(remote, [self.received] + args[1:])
+
+        server = RCT.RemoteConnection(RCT.WRCT_ANY_IP_ADDRESS, self.port)
+        server.host = "127.0.0.1"
+        client = RCT.AsyncRemoteConnection("127.0.0.1", self.port)
+        client.host = "127.0.0.1"
+        accepting = asyncio.create_task(asyncio.to_thread(server.passiveConnect, 5))
+        await asyncio.sleep(0.1)
+        await client.initiativeConnect(5)
+        await accepting
+        listener = threading.Thread(
+            target=server.listen, args=(dict(RCT.builtin_funcs, reciveFile=reciveFile),), daemon=True
+        )
+        listener.start()
+        listening = asyncio.create_task(client.listen(RCT.async_builtin_funcs))
+        await asyncio.sleep(0)
+
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            await RCT.getPathListAsync(client, [self.folder.name])
+        self.assertIn("sent.bin", output.getvalue())
+        await RCT.sendFileAsync(client, [self.sent])
+        await self._assertReceived()
+        page = await client.call("listPath", self.folder.name, 0, 10, timeout=5)
+        self.assertEqual(sorted(entry["name"] for entry in page["entries"]), ["received.bin", "sent.bin"])
+        RCT.closeRemote(client, [])
+        await asyncio.wait_for(listening, 5)
+        await asyncio.to_thread(listener.join, 5)
+        server.socketObject.close()
+
+
+class _FrameSource:
+    """Stands for a data connection: recvFrame returns the given frames."""
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.clientObject = socket.socket()
+
+    def recvFrame(self, channel=None):
+        return self.frames.pop(0)
+
+
+class StripeTest(unittest.TestCase):
+    def test_data_before_checksum(self):
+        with tempfile.TemporaryDirectory() as folder:
+            part = os.path.join(folder, "file.part")
+            with open(part, "wb") as file:
+                file.truncate(4)
+            channel = _FrameSource([(RCT.FRAME_DATA, 0, b"data")])
+            with self.assertRaisesRegex(RCT.RemoteToolkitError, "before its checksum"):
+                RCT._recive_stripes(channel, part, 1024)
+            channel.clientObject.close()
+
+
+class FanOutTest(unittest.TestCase):
+    def test_failing_host_does_not_stop_the_others(self):
+        results = list(RCT.fanOut(["bad\x00host", f"127.0.0.1:{_free_port()}"], "listPath", "/", timeout=5))
+        self.assertEqual(len(results), 2)
+        errors = {result.host: result.error for result in results}
+        self.assertIsInstance(errors["bad\x00host"], TypeError)  # Not an OSError
+        self.assertIsInstance(errors["127.0.0.1"], ConnectionRefusedError)
+        self.assertFalse(any(result.ok for result in results))
+
+
+class EncodeTest(unittest.TestCase):
+    def test_main_script_without_guard(self):
+        # The encoder processes can not start: the image is encoded in the script itself.
+        with tempfile.TemporaryDirectory() as folder:
+            script = os.path.join(folder, "unguarded.py")
+            with open(script, "w") as file:
+                file.write(
+                    f"import sys\nsys.path.insert(0, {os.path.dirname(os.path.dirname(os.path.abspath(__file__)))!r})\n"
+                    "import numpy, RemoteConnectionToolkit as RCT\n"
+                    "RCT._loggingReady = True\n"
+                    "pixels = numpy.zeros((600, 600, 3), numpy.uint8)\n"
+                    "print(RCT._encode(pixels, RCT._image_codec('png')) == RCT._encode_image(pixels, *RCT._image_codec('png')))\n"
+                )
+            result = subprocess.run([sys.executable, script], cwd=folder, capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split(), ["True"])
+
+
+class MetricsTest(unittest.TestCase):
+    def test_collecting_a_connection_while_the_registry_is_locked(self):
+        remote = RCT.RemoteConnection("127.0.0.1", 4469)
+        remote.trafficStats["bytesIn"] = 5
+        remote.cycle = remote  # Only freed by the cyclic GC
+        before = RCT.metrics_registry.snapshot()["bytesIn"]
+        del remote
+
+        def collect():
+            with RCT.metrics_registry._lock:
+                gc.collect()
+
+        collecting = threading.Thread(target=collect, daemon=True)
+        collecting.start()
+        collecting.join(5)
+        self.assertFalse(collecting.is_alive())
+        self.assertEqual(RCT.metrics_registry.snapshot()["bytesIn"], before)  # Still counted once gone
+
+    def test_closed_connection_is_retired(self):
+        test = LoopbackTest("test_direct_requests_while_listening")
+        test.setUp()
+        test.tearDown()
+        test.doCleanups()
+        snapshot = RCT.metrics_registry.snapshot()
+        self.assertNotIn(str(test.client.metricsId), snapshot["connections"])
+        self.assertGreater(snapshot["bytesOut"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()